@@ -15,6 +15,8 @@
 
 import bpy
 
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 import functools
 import itertools
@@ -27,11 +29,177 @@ from PyHSPlasma import *
 
 from . import utils
 
+class _KeyFrame:
+    __slots__ = ("frame_num", "frame_num_blender", "frame_time", "in_tans", "out_tans", "values", "values_raw")
+
+    def __init__(self, frame_num: float, fps: float, num_channels: int):
+        # hope you don't have a frame 29.9 and frame 30.0...
+        self.frame_num = int(frame_num * (30.0 / fps))
+        self.frame_num_blender = frame_num
+        self.frame_time = frame_num / fps
+        self.in_tans = [0.0] * num_channels
+        self.out_tans = [0.0] * num_channels
+
+
+class _FCurveKeys:
+    """Compact copy of an FCurve's keyframe points, read in bulk from Blender"""
+    __slots__ = ("fcurve", "frames", "values", "left_frames", "left_values",
+                 "right_frames", "right_values", "interpolation", "bezier",
+                 "_can_sample", "_samples")
+
+    def __init__(self, fcurve: bpy.types.FCurve):
+        # Ensure the keyframe points are sorted so that ranges can be bisected.
+        fcurve.update()
+
+        keyframe_points = fcurve.keyframe_points
+        num_keys = len(keyframe_points)
+        buf = array("f", [0.0]) * (num_keys * 2)
+
+        self.fcurve = fcurve
+        keyframe_points.foreach_get("co", buf)
+        self.frames, self.values = buf[0::2], buf[1::2]
+        keyframe_points.foreach_get("handle_left", buf)
+        self.left_frames, self.left_values = buf[0::2], buf[1::2]
+        keyframe_points.foreach_get("handle_right", buf)
+        self.right_frames, self.right_values = buf[0::2], buf[1::2]
+
+        # Enum properties can't be read by foreach_get, sadly.
+        self.interpolation = [i.interpolation for i in keyframe_points]
+        self.bezier = [i == "BEZIER" for i in self.interpolation]
+
+        # We can only evaluate the plain old curve ourselves. Anything fancier, such as
+        # modifiers, easing equations, or extrapolation, is left to Blender.
+        self._can_sample = (num_keys > 0 and not fcurve.modifiers and fcurve.extrapolation == "CONSTANT" and
+                            all(i in {"CONSTANT", "LINEAR", "BEZIER"} for i in self.interpolation))
+        self._samples = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def evaluate(self, frame_num: float) -> float:
+        """Evaluates the FCurve at a given frame, remembering the result for later use"""
+        value = self._samples.get(frame_num)
+        if value is None:
+            value = self.sample((frame_num,))[0]
+        return value
+
+    def sample(self, frame_nums: Sequence[float]) -> List[float]:
+        """Evaluates the FCurve at many frames at once, remembering the results for later use"""
+        samples = self._samples
+        missing = sorted(frozenset(i for i in frame_nums if i not in samples))
+        if missing:
+            if self._can_sample:
+                samples.update(zip(missing, self._sample_segments(missing)))
+            else:
+                evaluate = self.fcurve.evaluate
+                samples.update((i, evaluate(i)) for i in missing)
+        return [samples[i] for i in frame_nums]
+
+    def _sample_segments(self, frame_nums: Sequence[float]) -> Iterator[float]:
+        """Evaluates the curve at a sorted sequence of frames, one segment at a time"""
+        frames, values = self.frames, self.values
+        interpolation = self.interpolation
+        last_idx = len(frames) - 1
+
+        pos, num_frames = 0, len(frame_nums)
+        while pos < num_frames:
+            frame_num = frame_nums[pos]
+            if frame_num <= frames[0]:
+                yield values[0]
+                pos += 1
+                continue
+            if frame_num >= frames[last_idx]:
+                yield values[last_idx]
+                pos += 1
+                continue
+
+            # Gather up every requested frame that lands in this segment so that the segment
+            # only needs to be set up once.
+            seg_idx = bisect_right(frames, frame_num) - 1
+            frame_hi = frames[seg_idx + 1]
+            end = bisect_left(frame_nums, frame_hi, pos)
+            seg_frames = frame_nums[pos:end]
+            pos = end
+
+            mode = interpolation[seg_idx]
+            value_lo = values[seg_idx]
+            if mode == "CONSTANT":
+                yield from itertools.repeat(value_lo, len(seg_frames))
+            elif mode == "LINEAR":
+                frame_lo = frames[seg_idx]
+                slope = (values[seg_idx + 1] - value_lo) / (frame_hi - frame_lo)
+                yield from (value_lo + (i - frame_lo) * slope for i in seg_frames)
+            else:
+                yield from self._sample_bezier(seg_idx, seg_frames)
+
+    def _sample_bezier(self, seg_idx: int, frame_nums: Sequence[float]) -> Iterator[float]:
+        x0, y0 = self.frames[seg_idx], self.values[seg_idx]
+        x1, y1 = self.right_frames[seg_idx], self.right_values[seg_idx]
+        x2, y2 = self.left_frames[seg_idx + 1], self.left_values[seg_idx + 1]
+        x3, y3 = self.frames[seg_idx + 1], self.values[seg_idx + 1]
+
+        # Blender shortens handles that overlap the neighboring key so that the curve
+        # remains a function of time. Do the same, or we'll disagree with the graph editor.
+        span = x3 - x0
+        len1, len2 = abs(x0 - x1), abs(x3 - x2)
+        if len1 + len2 > span:
+            fac = span / (len1 + len2)
+            x1, y1 = x0 - fac * (x0 - x1), y0 - fac * (y0 - y1)
+            x2, y2 = x3 - fac * (x3 - x2), y3 - fac * (y3 - y2)
+
+        ax, bx, cx = x3 - x0 + 3.0 * (x1 - x2), 3.0 * (x0 - 2.0 * x1 + x2), 3.0 * (x1 - x0)
+        ay, by, cy = y3 - y0 + 3.0 * (y1 - y2), 3.0 * (y0 - 2.0 * y1 + y2), 3.0 * (y1 - y0)
+
+        # Solve x(t) = frame_num. x(t) is monotonic after the correction above, so Newton's
+        # method with a bisection fallback converges quickly. The frames are sorted, so each
+        # solution is a lower bound for the next one.
+        lo = 0.0
+        for frame_num in frame_nums:
+            hi = 1.0
+            t = max((frame_num - x0) / span, lo)
+            for _ in range(16):
+                x = ((ax * t + bx) * t + cx) * t + x0 - frame_num
+                if abs(x) < 1.0e-5:
+                    break
+                if x > 0.0:
+                    hi = t
+                else:
+                    lo = t
+                dx = (3.0 * ax * t + 2.0 * bx) * t + cx
+                t = t - x / dx if dx else -1.0
+                if not lo < t < hi:
+                    t = (lo + hi) * 0.5
+            lo = t
+            yield ((ay * t + by) * t + cy) * t + y0
+
+    def indices_in_range(self, start: Optional[int], end: Optional[int]) -> range:
+        frames = self.frames
+        lo = 0 if start is None else bisect_left(frames, start)
+        hi = len(frames) if end is None else bisect_right(frames, end)
+        return range(lo, hi)
+
+
 class AnimationConverter:
     def __init__(self, exporter):
         self._exporter = weakref.ref(exporter)
         self._bl_fps = bpy.context.scene.render.fps
 
+        # Objects with many animation ranges reprocess the same FCurves over and over,
+        # so the keyframe points are only read once per export.
+        self._fcurve_keys: Dict[int, _FCurveKeys] = {}
+
+        age = bpy.context.scene.world.plasma_age
+        if age.anim_reduce_keys:
+            self._key_tolerances = {
+                "color": age.anim_tolerance_color,
+                "position": age.anim_tolerance_position,
+                "rotation": age.anim_tolerance_rotation,
+                "scale": age.anim_tolerance_scale,
+                "volume": age.anim_tolerance_volume,
+            }
+        else:
+            self._key_tolerances = {}
+
     def convert_frame_time(self, frame_num: int) -> float:
         return frame_num / self._bl_fps
 
@@ -174,6 +342,8 @@ class AnimationConverter:
                                                              convert=convert_specular_animation,
                                                              start=start, end=end)
         if color_keyframes and lamp.use_specular:
+            color_keyframes = self._reduce_keyframes(color_keyframes, "color", range(3) if color_bez else (),
+                                                     name=f"'{name}' specular color")
             channel = plPointControllerChannel()
             channel.controller = self._make_point3_controller(color_keyframes, color_bez)
             applicator = plLightSpecularApplicator()
@@ -196,6 +366,8 @@ class AnimationConverter:
                                                   start=start, end=end)
         if not diffuse_keyframes:
             return None
+        diffuse_keyframes = self._reduce_keyframes(diffuse_keyframes, "color", (),
+                                                   name=f"'{name}' diffuse color")
 
         # Whew.
         channel = plPointControllerChannel()
@@ -282,7 +454,8 @@ class AnimationConverter:
             applicator.channelName = name
             applicator.index = i
 
-            controller = self.make_scalar_leaf_controller(fcurve, convert=convert_volume, start=start, end=end)
+            controller = self.make_scalar_leaf_controller(fcurve, convert=convert_volume, start=start, end=end,
+                                                          reduce="volume", name=f"'{name}' volume")
             if controller is not None:
                 channel = plScalarControllerChannel()
                 channel.controller = controller
@@ -419,6 +592,13 @@ class AnimationConverter:
         tm.Z = scale
         return tm
 
+    def _get_fcurve_keys(self, fcurve: bpy.types.FCurve) -> _FCurveKeys:
+        keys = self._fcurve_keys.get(fcurve.as_pointer())
+        if keys is None:
+            keys = _FCurveKeys(fcurve)
+            self._fcurve_keys[fcurve.as_pointer()] = keys
+        return keys
+
     def get_anigraph_keys(self, bo=None, so=None) -> Tuple[plKey, plKey]:
         mod = self._mgr.find_create_key(plAGModifier, so=so, bl=bo)
         master = self._mgr.find_create_key(plAGMasterMod, so=so, bl=bo)
@@ -514,6 +694,8 @@ class AnimationConverter:
                                                        start=start, end=end)
         if not keyframes:
             return None
+        keyframes = self._reduce_keyframes(keyframes, "position", range(3) if bez_chans else (),
+                                           name="position")
 
         # At one point, I had some... insanity here to try to crush bezier channels and hand off to
         # blah blah blah... As it turns out, point3 keyframe's tangents are vector3s :)
@@ -545,6 +727,7 @@ class AnimationConverter:
             keyframes, bez_chans = self._process_keyframes(rot_curves, 4, default_xform, convert,
                                                            start=start, end=end)
             if keyframes:
+                keyframes = self._reduce_keyframes(keyframes, "rotation", (), name="rotation", quat=True)
                 return self._make_quat_controller(keyframes)
         else:
             rot_curves = [i for i in fcurves if i.data_path == "rotation_euler" and i.keyframe_points]
@@ -570,8 +753,10 @@ class AnimationConverter:
                 # we would just drop support for rotation beziers entirely to simplify all this
                 # Euler crap, but some artists may require bezier interpolation...
                 if bez_chans:
+                    keyframes = self._reduce_keyframes(keyframes, "rotation", bez_chans, name="rotation")
                     return self._make_scalar_compound_controller(keyframes, bez_chans)
                 else:
+                    keyframes = self._reduce_keyframes(keyframes, "rotation", (), name="rotation", quat=True)
                     return self._make_quat_controller(keyframes)
 
     def make_scale_controller(self, fcurves, data_path: str, default_xform,
@@ -582,6 +767,8 @@ class AnimationConverter:
                                                        start=start, end=end)
         if not keyframes:
             return None
+        keyframes = self._reduce_keyframes(keyframes, "scale", range(3) if bez_chans else (),
+                                           name="scale")
 
         # There is no such thing as a compound scale controller... in Plasma, anyway.
         ctrl = self._make_scale_value_controller(keyframes, bez_chans)
@@ -590,10 +777,14 @@ class AnimationConverter:
     def make_scalar_leaf_controller(self, fcurve: bpy.types.FCurve,
                                     convert: Optional[Callable] = None, *,
                                     start: Optional[int] = None,
-                                    end: Optional[int] = None) -> Optional[plLeafController]:
+                                    end: Optional[int] = None,
+                                    reduce: Optional[str] = None,
+                                    name: Optional[str] = None) -> Optional[plLeafController]:
         keyframes, bezier = self._process_fcurve(fcurve, convert, start=start, end=end)
         if not keyframes:
             return None
+        if reduce is not None:
+            keyframes = self._reduce_keyframes(keyframes, reduce, bezier, name=name)
 
         ctrl = self._make_scalar_leaf_controller(keyframes, bezier)
         return ctrl
@@ -740,6 +931,78 @@ class AnimationConverter:
                 return []
         return [keyframes_sorted[i] for i in filtered_indices]
 
+    def _reduce_keyframes(self, keyframes: Sequence, tolerance_type: str, bez_chans: Container[int], *,
+                          name: Optional[str] = None, quat: bool = False) -> Sequence:
+        """Removes keyframes that can be recreated by interpolating their neighbors to within
+           the age's tolerance for this kind of channel. This is a Ramer-Douglas-Peucker pass
+           over the sorted keyframes, using the same interpolation that the controller will
+           use at runtime: linear (or slerp for quaternions) for most channels and a hermite
+           curve built from the keyframe tangents for bezier channels."""
+        tolerance = self._key_tolerances.get(tolerance_type)
+        num_keyframes = len(keyframes)
+        if tolerance is None or num_keyframes < 3:
+            return keyframes
+
+        fps, pi = self._bl_fps, math.pi
+        # The keyframe tangents were scaled down by the frame rate and 2pi, so undo that
+        # to get back to the per-frame slopes that the hermite curve needs.
+        tan_scale = fps * 2.0 * pi
+
+        if quat:
+            def to_quat(values):
+                if len(values) == 3:
+                    return mathutils.Euler(values).to_quaternion()
+                result = mathutils.Quaternion(values)
+                result.normalize()
+                return result
+            quats = [to_quat(i.values) for i in keyframes]
+
+        def calc_error(lo: int, hi: int, i: int) -> float:
+            left, me, right = keyframes[lo], keyframes[i], keyframes[hi]
+            frame_lo, frame_hi = left.frame_num_blender, right.frame_num_blender
+            span = frame_hi - frame_lo
+            t = (me.frame_num_blender - frame_lo) / span
+
+            if quat:
+                return quats[lo].slerp(quats[hi], t).rotation_difference(quats[i]).angle
+
+            t2, t3 = t * t, t * t * t
+            h00, h10 = 2.0 * t3 - 3.0 * t2 + 1.0, t3 - 2.0 * t2 + t
+            h01, h11 = -2.0 * t3 + 3.0 * t2, t3 - t2
+
+            def iter_deltas():
+                for j, (value, v0, v1) in enumerate(zip(me.values, left.values, right.values)):
+                    if j in bez_chans:
+                        m0 = left.out_tans[j] * tan_scale * span
+                        m1 = -right.in_tans[j] * tan_scale * span
+                        expected = h00 * v0 + h10 * m0 + h01 * v1 + h11 * m1
+                    else:
+                        expected = v0 + (v1 - v0) * t
+                    yield value - expected
+
+            if tolerance_type == "position":
+                return math.sqrt(sum(d * d for d in iter_deltas()))
+            return max(abs(d) for d in iter_deltas())
+
+        keep = [False] * num_keyframes
+        keep[0] = keep[-1] = True
+        stack = [(0, num_keyframes - 1)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo < 2:
+                continue
+            max_error, max_idx = max((calc_error(lo, hi, i), i) for i in range(lo + 1, hi))
+            if max_error > tolerance:
+                keep[max_idx] = True
+                stack.append((lo, max_idx))
+                stack.append((max_idx, hi))
+
+        result = [keyframe for keyframe, kept in zip(keyframes, keep) if kept]
+        if len(result) < num_keyframes:
+            self._exporter().report.msg("Reduced {} keyframes from {} to {}", name or tolerance_type,
+                                        num_keyframes, len(result))
+        return result
+
     def _process_fcurve(self, fcurve: bpy.types.FCurve, convert: Optional[Callable] = None, *,
                         start: Optional[int] = None, end: Optional[int] = None) -> Tuple[Sequence, AbstractSet]:
         """Like _process_keyframes, but for one fcurve"""
@@ -781,34 +1044,27 @@ class AnimationConverter:
         # TODO: This fxn should probably issue a warning if any keyframes use bezier interpolation.
         # But there's no indication given by any other fxn when an invalid interpolation mode is
         # given, so what can you do?
-        keyframe_data = type("KeyFrameData", (), {})
-        fps, pi = self._bl_fps, math.pi
+        fps = self._bl_fps
 
         grouped_fcurves = defaultdict(dict)
-        for fcurve in (i for i in fcurves if i is not None):
-            fcurve.update()
-            grouped_fcurves[fcurve.data_path][fcurve.array_index] = fcurve
-
-        if start is not None and end is not None:
-            framenum_filter = lambda x: x.co[0] >= start and x.co[0] <= end
-        elif start is not None and end is None:
-            framenum_filter = lambda x: x.co[0] >= start
-        elif start is None and end is not None:
-            framenum_filter = lambda x: x.co[0] <= end
-        else:
-            framenum_filter = lambda x: True
-
         fcurve_keyframes = defaultdict(lambda: defaultdict(dict))
         for fcurve in (i for i in fcurves if i is not None):
-            for fkey in filter(framenum_filter, fcurve.keyframe_points):
-                fcurve_keyframes[fkey.co[0]][fcurve.data_path][fcurve.array_index] = fkey
+            keys = self._get_fcurve_keys(fcurve)
+            grouped_fcurves[fcurve.data_path][fcurve.array_index] = keys
+            for i in keys.indices_in_range(start, end):
+                fcurve_keyframes[keys.frames[i]][fcurve.data_path][fcurve.array_index] = keys.values[i]
+
+        # Fill in the gaps between channels in one go rather than one frame at a time.
+        for data_path, indexed_keys in grouped_fcurves.items():
+            for i, keys in indexed_keys.items():
+                keys.sample([frame_num for frame_num, fkeys in fcurve_keyframes.items() if i not in fkeys[data_path]])
 
         def iter_channel_values(frame_num : int, fcurves : Dict, fkeys : Dict, num_channels : int, defaults : Union[float, Sequence]):
             for i in range(num_channels):
-                fkey = fkeys.get(i, None)
-                if fkey is None:
-                    fcurve = fcurves.get(i, None)
-                    if fcurve is None:
+                value = fkeys.get(i, None)
+                if value is None:
+                    keys = fcurves.get(i, None)
+                    if keys is None:
                         # We would like to test this to see if it makes sense, but Blender's mathutils
                         # types don't actually implement the sequence protocol. So, we'll have to
                         # just try to subscript it and see what happens.
@@ -818,24 +1074,16 @@ class AnimationConverter:
                             assert num_channels == 1, "Got a non-subscriptable default for a multi-channel keyframe."
                             yield defaults
                     else:
-                        yield fcurve.evaluate(frame_num)
+                        yield keys.evaluate(frame_num)
                 else:
-                    yield fkey.co[1]
+                    yield value
 
         keyframes = {}
         for frame_num, fkeys in fcurve_keyframes.items():
-            keyframe = keyframe_data()
-            # hope you don't have a frame 29.9 and frame 30.0...
-            keyframe.frame_num = int(frame_num * (30.0 / fps))
-            keyframe.frame_num_blender = frame_num
-            keyframe.frame_time = frame_num / fps
-            keyframe.values_raw = { data_path: tuple(iter_channel_values(frame_num, grouped_fcurves[data_path], fkeys, num_channels, defaults[data_path]))
+            keyframe = _KeyFrame(frame_num, fps, result_channels)
+            keyframe.values_raw = { data_path: tuple(iter_channel_values(frame_num, grouped_fcurves[data_path], fkeys[data_path], num_channels, defaults[data_path]))
                                     for data_path, num_channels in channels.items() }
             keyframe.values = self._santize_converted_values(result_channels, keyframe.values_raw, convert)
-
-            # Very gnawty
-            keyframe.in_tans = [0.0] * result_channels
-            keyframe.out_tans = [0.0] * result_channels
             keyframes[frame_num] = keyframe
 
         return self._sort_and_dedupe_keyframes(keyframes)
@@ -844,35 +1092,28 @@ class AnimationConverter:
                            convert: Optional[Callable] = None, *, start: Optional[int] = None,
                            end: Optional[int] = None) -> Tuple[Sequence, AbstractSet]:
         """Groups all FCurves for the same frame together"""
-        keyframe_data = type("KeyFrameData", (), {})
         fps, pi = self._bl_fps, math.pi
 
         keyframes, fcurve_keyframes = {}, defaultdict(dict)
 
-        if start is not None and end is not None:
-            framenum_filter = lambda x: x.co[0] >= start and x.co[0] <= end
-        elif start is not None and end is None:
-            framenum_filter = lambda x: x.co[0] >= start
-        elif start is None and end is not None:
-            framenum_filter = lambda x: x.co[0] <= end
-        else:
-            framenum_filter = lambda x: True
+        indexed_keys = { fcurve.array_index: self._get_fcurve_keys(fcurve) for fcurve in fcurves if fcurve is not None }
+        for i, keys in indexed_keys.items():
+            for j in keys.indices_in_range(start, end):
+                fcurve_keyframes[keys.frames[j]][i] = j
 
-        indexed_fcurves = { fcurve.array_index: fcurve for fcurve in fcurves if fcurve is not None }
-        for i, fcurve in indexed_fcurves.items():
-            fcurve.update()
-            for fkey in filter(framenum_filter, fcurve.keyframe_points):
-                fcurve_keyframes[fkey.co[0]][i] = fkey
+        # Fill in the gaps between channels in one go rather than one frame at a time.
+        for i, keys in indexed_keys.items():
+            keys.sample([frame_num for frame_num, fkeys in fcurve_keyframes.items() if i not in fkeys])
 
         def iter_values(frame_num, fkeys) -> Generator[float, None, None]:
             for i in range(num_channels):
-                fkey = fkeys.get(i, None)
-                if fkey is not None:
-                    yield fkey.co[1]
+                key_idx = fkeys.get(i, None)
+                if key_idx is not None:
+                    yield indexed_keys[i].values[key_idx]
                 else:
-                    fcurve = indexed_fcurves.get(i, None)
-                    if fcurve is not None:
-                        yield fcurve.evaluate(frame_num)
+                    keys = indexed_keys.get(i, None)
+                    if keys is not None:
+                        yield keys.evaluate(frame_num)
                     else:
                         yield default_values[i]
 
@@ -880,23 +1121,20 @@ class AnimationConverter:
         bez_chans = set()
 
         for frame_num, fkeys in fcurve_keyframes.items():
-            keyframe = keyframe_data()
-            # hope you don't have a frame 29.9 and frame 30.0...
-            keyframe.frame_num = int(frame_num * (30.0 / fps))
-            keyframe.frame_num_blender = frame_num
-            keyframe.frame_time = frame_num / fps
-            keyframe.in_tans = [0.0] * num_channels
-            keyframe.out_tans = [0.0] * num_channels
+            keyframe = _KeyFrame(frame_num, fps, num_channels)
             keyframe.values_raw = tuple(iter_values(frame_num, fkeys))
             if convert is None:
                 keyframe.values = keyframe.values_raw
             else:
                 keyframe.values = self._santize_converted_values(num_channels, keyframe.values_raw, convert)
 
-            for i, fkey in ((i, fkey) for i, fkey in fkeys.items() if fkey.interpolation == "BEZIER"):
+            for i, key_idx in fkeys.items():
+                keys = indexed_keys[i]
+                if not keys.bezier[key_idx]:
+                    continue
                 value = keyframe.values_raw[i]
-                keyframe.in_tans[i] = -(value - fkey.handle_left[1])  / (frame_num - fkey.handle_left[0])  / fps / (2 * pi)
-                keyframe.out_tans[i] = (value - fkey.handle_right[1]) / (frame_num - fkey.handle_right[0]) / fps / (2 * pi)
+                keyframe.in_tans[i] = -(value - keys.left_values[key_idx])  / (frame_num - keys.left_frames[key_idx])  / fps / (2 * pi)
+                keyframe.out_tans[i] = (value - keys.right_values[key_idx]) / (frame_num - keys.right_frames[key_idx]) / fps / (2 * pi)
                 bez_chans.add(i)
             keyframes[frame_num] = keyframe
 
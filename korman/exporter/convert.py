@@ -73,7 +73,7 @@ class Exporter:
 
     def run(self):
         log = logger.ExportVerboseLogger if self._op.verbose else logger.ExportProgressLogger
-        with ConsoleToggler(self._op.show_console), log(self._op.filepath) as self.report, ExitStack() as self.exit_stack:
+        with ConsoleToggler(self._op.show_console), log(self._op.filepath, self._op.log_level, self._op.event_log, self._op.live_progress) as self.report, ExitStack() as self.exit_stack:
             # Step 0: Init export resmgr and stuff
             self.mgr = ExportManager(self)
             self.mesh = MeshConverter(self)
@@ -85,7 +85,7 @@ class Exporter:
             self.image = ImageCache(self)
             self.locman = LocalizationConverter(self)
             self.decal = DecalConverter(self)
-            self.oven = LightBaker(mesh=self.mesh, report=self.report)
+            self.oven = LightBaker(mesh=self.mesh, lamps=self.light.lamp_index, report=self.report)
             self.gui = GuiConverter(self)
 
             # Step 0.8: Init the progress mgr
@@ -293,7 +293,7 @@ class Exporter:
 
         with self.report.indent():
             for bl_obj in self._objects:
-                for mod in filter(lambda x: hasattr(x, "export_localization"), bl_obj.plasma_modifiers.modifiers):
+                for mod in bl_obj.plasma_modifiers.translatable_modifiers:
                     mod.export_localization(self)
                 inc_progress()
 
@@ -303,11 +303,12 @@ class Exporter:
         inc_progress = self.report.progress_increment
         log_msg = self.report.msg
         indent = self.report.indent
+        event_timer = self.report.event_timer
 
         for bl_obj in self._objects:
             log_msg(f"\n[SceneObject '{bl_obj.name}']")
 
-            with indent():
+            with indent(), event_timer("export_object", name=bl_obj.name, type=bl_obj.type):
                 # First pass: do things specific to this object type.
                 #             note the function calls: to export a MESH, it's _export_mesh_blobj
                 export_fn = "_export_{}_blobj".format(bl_obj.type.lower())
@@ -591,6 +592,10 @@ class Exporter:
             finally:
                 self.image.save()
 
+                # Deferred import because the modifier properties import the exporter.
+                from ..properties.modifiers.sound import save_sound_info_cache
+                save_sound_info_cache()
+
     @property
     def age_name(self):
         if self._op.dat_only:
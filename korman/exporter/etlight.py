@@ -15,20 +15,101 @@
 
 import bpy
 
+import array
 from contextlib import contextmanager
+from hashlib import md5
 import itertools
+import math
+from typing import *
 
 from .explosions import *
 from .logger import ExportProgressLogger, ExportVerboseLogger
 from .mesh import _MeshManager, _VERTEX_COLOR_LAYERS
+from .rtlight import LampIndex
 from ..helpers import *
 
 _NUM_RENDER_LAYERS = 20
 
+# Automatically sized lightmaps are kept within these limits. The lower bound exists because
+# anything smaller is hardly worth the overhead of its own texture and layer.
+_MIN_AUTO_LIGHTMAP_SIZE = 32
+_DEFAULT_MAX_LIGHTMAP_SIZE = 1024
+_DEFAULT_LIGHTMAP_DENSITY = 16.0
+
+# Lightmaps are decompressed to ARGB32 by the client, regardless of how they are stored in the PRP.
+_LIGHTMAP_BYTES_PER_PIXEL = 4
+
+# Margins used by the UV operators when generating lightmap UVs. These are part of the
+# lightmap UV cache key, so changing them invalidates all cached unwraps.
+_LIGHTMAP_ISLAND_MARGIN = 0.05
+_LIGHTMAP_PACK_MARGIN = 0.01
+
+# Lightmaps are analyzed after baking to find constant and duplicate lightmaps as well as the
+# cheapest acceptable encoding. Constant lightmaps are replaced by a tiny shared image that is
+# still large enough to survive the mip level clipping done for DXT compressed textures.
+_CONSTANT_LIGHTMAP_SIZE = 8
+_CONSTANT_LIGHTMAP_TOLERANCE = 0.5 / 255.0
+_DXT1_SAMPLE_BLOCKS = 256
+_UNCOMPRESSED_MAX_PIXELS = 256
+
+# Generated lightmap UVs for the lifetime of this Blender session. This is mostly useful for
+# meshes that are collapsed by the mesh manager, because the collapsed mesh is thrown away
+# at the end of every export, taking its lightmap UVs with it.
+# { object name: (cache key, loop UVs) }
+_lightmap_uv_cache = {}
+
+# Estimated DXT1 errors of lightmap contents seen during this Blender session, so that
+# lightmaps that bake out the same as last time don't need to be estimated again.
+# { pixel digest: estimated error }
+_lightmap_dxt_errors = {}
+
+class _LightmapInfo:
+    __slots__ = ("digest", "constant", "dxt_error")
+
+    def __init__(self, digest, constant, dxt_error):
+        self.digest = digest
+        self.constant = constant
+        self.dxt_error = dxt_error
+
+
+def _estimate_dxt1_error(pixels, width, height) -> float:
+    """Estimates the RMS error (in 8-bit color levels) of DXT1 compressing an RGBA float image"""
+    blocks_x, blocks_y = width // 4, height // 4
+    num_blocks = blocks_x * blocks_y
+    if num_blocks == 0:
+        return 0.0
+
+    # DXT1 stores two RGB565 endpoints per 4x4 block and interpolates two more colors between
+    # them. This approximates the encoder by using the block's bounding box diagonal as the
+    # color line, which is good enough for the smooth gradients we expect in lightmaps.
+    def quantize(value, levels):
+        return round(value * levels) / levels
+
+    # Sample the blocks on an even grid over the whole image. Taking every nth block in scanline
+    # order could end up looking at only a few columns.
+    sq_error, num_texels = 0.0, 0
+    step = max(1, math.ceil(math.sqrt(num_blocks / _DXT1_SAMPLE_BLOCKS)))
+    for block_x, block_y in itertools.product(range(0, width - 3, step * 4), range(0, height - 3, step * 4)):
+        # Each row of the block is 16 contiguous floats, so the channels can be sliced out.
+        block_pixels = array.array("f")
+        for row in range(block_y, block_y + 4):
+            start = (row * width + block_x) * 4
+            block_pixels.extend(pixels[start:start+16])
+        channels = [block_pixels[c::4] for c in range(3)]
+        palette = []
+        for values, levels in zip(channels, (31, 63, 31)):
+            lo, hi = quantize(min(values), levels), quantize(max(values), levels)
+            palette.append((lo, lo + (hi - lo) / 3.0, lo + (hi - lo) * 2.0 / 3.0, hi))
+        for r, g, b in zip(*channels):
+            sq_error += min(((r - pr) ** 2 + (g - pg) ** 2 + (b - pb) ** 2 for pr, pg, pb in zip(*palette)))
+        num_texels += 16
+    return math.sqrt(sq_error / (num_texels * 3)) * 255.0
+
+
 class LightBaker:
     """ExportTime Lighting"""
 
-    def __init__(self, *, mesh=None, report=None, verbose=False):
+    def __init__(self, *, mesh=None, lamps=None, report=None, verbose=False):
         self._lightgroups = {}
         if report is None:
             self._report = ExportVerboseLogger() if verbose else ExportProgressLogger()
@@ -43,6 +124,7 @@ class LightBaker:
         # which may be stored in the exporter's mesh manager, we've changed from is-a to has-a
         # semantics. Sorry for this confusion!
         self._mesh = _MeshManager(self._report) if mesh is None else mesh
+        self._lamps = LampIndex() if lamps is None else lamps
 
         self.vcol_layer_name = "autocolor"
         self.lightmap_name = "{}_LIGHTMAPGEN.png"
@@ -50,6 +132,10 @@ class LightBaker:
         self.retain_lightmap_uvtex = True
         self.force = False
         self._lightmap_images = {}
+        self._lightmap_info = {}
+        self._lightmap_digests = {}
+        self._constant_lightmaps = {}
+        self._lightmap_sizes = {}
         self._uvtexs = {}
         self._active_vcols = {}
 
@@ -145,6 +231,7 @@ class LightBaker:
         self._report.progress_range = len(bake)
         self._report.msg("Preparing to bake...")
         with self._report.indent():
+            self._size_lightmaps(bake)
             for key, value in bake.items():
                 if key[0] == "lightmap":
                     for i in range(len(value)-1, -1, -1):
@@ -186,9 +273,110 @@ class LightBaker:
                     raise RuntimeError(key[0])
             inc_progress()
 
+        # Step 3: Look for lightmaps that could be shared or simplified
+        self._analyze_lightmaps(bake)
+
         # Return how many thingos we baked
         return sum(map(len, bake.values()))
 
+    def analyze_lightmap(self, image) -> Optional[_LightmapInfo]:
+        """Inspects the pixels of a baked lightmap to find out if it is constant, which other
+           lightmaps it is identical to, and how well it would survive DXT1 compression."""
+        info = self._lightmap_info.get(image.name)
+        if info is not None:
+            return info
+
+        width, height = image.size
+        if width == 0 or height == 0:
+            return None
+
+        pixels = array.array("f", [0.0]) * (width * height * 4)
+        if hasattr(image.pixels, "foreach_get"):
+            image.pixels.foreach_get(pixels)
+        else:
+            # Blender 2.79's property arrays can't foreach_get, so this copy is unavoidable.
+            pixels[:] = array.array("f", image.pixels[:])
+        hasher = md5(repr((width, height)).encode())
+        hasher.update(pixels.tobytes())
+        digest = hasher.hexdigest()
+
+        channels = [pixels[i::4] for i in range(3)]
+        if all((max(i) - min(i) <= _CONSTANT_LIGHTMAP_TOLERANCE for i in channels)):
+            constant = tuple((round(i[0] * 255.0) for i in channels))
+            dxt_error = 0.0
+        else:
+            constant = None
+            dxt_error = _lightmap_dxt_errors.get(digest)
+            if dxt_error is None:
+                dxt_error = _estimate_dxt1_error(pixels, width, height)
+                _lightmap_dxt_errors[digest] = dxt_error
+
+        info = _LightmapInfo(digest, constant, dxt_error)
+        self._lightmap_info[image.name] = info
+        return info
+
+    def _analyze_lightmaps(self, bake):
+        lightmap_iter = itertools.chain.from_iterable((value for key, value in bake.items() if key[0] == "lightmap"))
+        num_constant, digests = 0, set()
+        num_lightmaps = 0
+
+        self._report.msg("Analyzing lightmaps...")
+        with self._report.indent():
+            for bo in lightmap_iter:
+                image = self.get_lightmap(bo)
+                if image is None:
+                    continue
+                info = self.analyze_lightmap(image)
+                if info is None:
+                    continue
+                num_lightmaps += 1
+                if info.constant is not None:
+                    self._report.msg("'{}': Lightmap is a constant color {}", bo.name, info.constant)
+                    num_constant += 1
+                elif info.digest in digests:
+                    self._report.msg("'{}': Lightmap is a duplicate", bo.name)
+                else:
+                    self._report.msg("'{}': Estimated DXT1 error: {:.2f}", bo.name, info.dxt_error)
+                    digests.add(info.digest)
+        if num_lightmaps:
+            self._report.msg("{} lightmap(s), {} constant, {} unique", num_lightmaps, num_constant, len(digests))
+
+    def get_lightmap_export(self, image, max_error: float) -> Tuple[bpy.types.Image, Set[str]]:
+        """Given a lightmap image, returns the image that should actually be exported in its
+           place, along with the image formats allowed for it."""
+        info = self.analyze_lightmap(image)
+        if info is None:
+            return image, {"PNG", "JPG"}
+
+        if info.constant is not None:
+            shared_image = self._constant_lightmaps.get(info.constant)
+            if shared_image is None:
+                shared_image = self._make_constant_lightmap(info.constant)
+                self._constant_lightmaps[info.constant] = shared_image
+            self._report.msg("Lightmap '{}' is a constant color, using '{}'", image.name, shared_image.name)
+            return shared_image, {"DDS"} if max_error > 0.0 else {"PNG", "JPG"}
+
+        canonical_image = self._lightmap_digests.setdefault(info.digest, image)
+        if canonical_image != image:
+            self._report.msg("Lightmap '{}' is identical to '{}'", image.name, canonical_image.name)
+
+        width, height = canonical_image.size
+        if width * height <= _UNCOMPRESSED_MAX_PIXELS:
+            allowed_formats = {"BMP"}
+        elif max_error > 0.0 and info.dxt_error <= max_error:
+            allowed_formats = {"DDS"}
+        else:
+            allowed_formats = {"PNG", "JPG"}
+        return canonical_image, allowed_formats
+
+    def _make_constant_lightmap(self, color):
+        name = "LIGHTMAPGEN_CONSTANT_{:02X}{:02X}{:02X}".format(*color)
+        size = _CONSTANT_LIGHTMAP_SIZE
+        image = bpy.data.images.new(name, width=size, height=size)
+        image.pixels = [i / 255.0 for i in color + (255,)] * (size * size)
+        self._mesh.context_stack.enter_context(TemporaryObject(image, bpy.data.images.remove))
+        return image
+
     @contextmanager
     def _bmesh_from_mesh(self, mesh):
         bm = bmesh.new()
@@ -276,21 +464,18 @@ class LightBaker:
                 self._lightgroups[mat_name] = lg
 
             if not user_lg:
-                if not lg or bool(lg.objects) is False:
-                    source = [i for i in bpy.context.scene.objects if i.type == "LAMP"]
-                else:
-                    source = lg.objects
                 dest = bpy.data.groups.new("_LIGHTMAPGEN_{}_{}".format(bo.name, mat_name))
 
                 # Rules:
                 # 1) No animated lights, period.
                 # 2) If we accept runtime lighting, no Plasma Objects
-                rtl_mod = bo.plasma_modifiers.lighting
+                # The lamp index has already sorted out which lamps pass these rules.
+                include_plasma = not bo.plasma_modifiers.lighting.rt_lights
+                if not lg or bool(lg.objects) is False:
+                    source = self._lamps.bakeable_lamps(include_plasma)
+                else:
+                    source = (i for i in lg.objects if self._lamps.is_bakeable(i, include_plasma))
                 for obj in source:
-                    if obj.plasma_object.has_animation_data:
-                        continue
-                    if rtl_mod.rt_lights and obj.plasma_object.enabled:
-                        continue
                     dest.objects.link(obj)
                     shouldibake = True
             else:
@@ -306,6 +491,46 @@ class LightBaker:
     def get_lightmap_name(self, bo):
         return self.lightmap_name.format(bo.name)
 
+    def get_lightmap_size(self, bo):
+        size = self._lightmap_sizes.get(bo.name)
+        if size is None:
+            size = self._calc_lightmap_size(bo)
+            self._lightmap_sizes[bo.name] = size
+        return size
+
+    def _calc_lightmap_size(self, bo):
+        modifier = bo.plasma_modifiers.lightmap
+        if not modifier.auto_resolution:
+            return modifier.resolution
+
+        world = bpy.context.scene.world
+        if world is not None:
+            age = world.plasma_age
+            density = age.lightmap_density
+            page_name = bo.plasma_object.page
+            if page_name:
+                page = next((i for i in age.pages if i.name == page_name), None)
+            else:
+                page = next((i for i in age.pages if i.seq_suffix == 0), None)
+            max_size = int(page.lightmap_max_size) if page is not None else _DEFAULT_MAX_LIGHTMAP_SIZE
+        else:
+            density = _DEFAULT_LIGHTMAP_DENSITY
+            max_size = _DEFAULT_MAX_LIGHTMAP_SIZE
+
+        # The mesh has already had its Blender modifiers applied by the mesh manager, so all
+        # we need to do is bring it into world space to account for object scaling.
+        with self._bmesh_from_mesh(bo.data) as bm:
+            bm.transform(bo.matrix_world)
+            area = sum((face.calc_area() for face in bm.faces))
+
+        # Pick the power of two nearest to the desired edge length (in log space), so that
+        # the effective density stays within a factor of sqrt(2) of the target.
+        edge_length = math.sqrt(area) * density
+        if edge_length <= _MIN_AUTO_LIGHTMAP_SIZE:
+            return _MIN_AUTO_LIGHTMAP_SIZE
+        size = pow(2, round(math.log(edge_length, 2)))
+        return max(_MIN_AUTO_LIGHTMAP_SIZE, min(size, max_size))
+
     def _has_valid_material(self, bo):
         for material in bo.data.materials:
             if material is not None:
@@ -383,6 +608,23 @@ class LightBaker:
                 bake_vcol.append(i)
         return bake
 
+    def _size_lightmaps(self, bake):
+        lightmap_iter = itertools.chain.from_iterable((value for key, value in bake.items() if key[0] == "lightmap"))
+        page_budgets = {}
+        for bo in lightmap_iter:
+            size = self.get_lightmap_size(bo)
+            if bo.plasma_modifiers.lightmap.auto_resolution:
+                self._report.msg("'{}': Automatic lightmap size is {}x{}", bo.name, size, size)
+            page_name = bo.plasma_object.page
+            page_budgets[page_name] = page_budgets.get(page_name, 0) + size * size * _LIGHTMAP_BYTES_PER_PIXEL
+
+        if page_budgets:
+            total = sum(page_budgets.values())
+            self._report.msg("Lightmap memory budget: {:.2f} MiB", total / 1048576)
+            with self._report.indent():
+                for page_name, budget in sorted(page_budgets.items()):
+                    self._report.msg("Page '{}': {:.2f} MiB", page_name if page_name else "Default", budget / 1048576)
+
     def _pack_lightmaps(self, objs):
         for bo in objs:
             im = self.get_lightmap(bo)
@@ -424,7 +666,7 @@ class LightBaker:
         # We need to ensure that we bake onto the "BlahObject_LIGHTMAPGEN" image
         data_images = bpy.data.images
         im_name = self.get_lightmap_name(bo)
-        size = modifier.resolution
+        size = self.get_lightmap_size(bo)
 
         im = data_images.get(im_name)
         if im is None:
@@ -449,23 +691,86 @@ class LightBaker:
         # Indicate we should bake
         return True
 
+    def _calc_lightmap_uv_key(self, bo):
+        """Calculates a hash of everything that influences the generated lightmap UVs"""
+        mesh = bo.data
+        modifier = bo.plasma_modifiers.lightmap
+        uv_base = mesh.uv_layers.get(modifier.uv_map) if modifier.uv_map else None
+
+        hasher = md5()
+        settings = (self.lightmap_uvtex_name, modifier.uv_map if uv_base is not None else "",
+                    self._mesh.is_collapsed(bo), _LIGHTMAP_ISLAND_MARGIN, _LIGHTMAP_PACK_MARGIN)
+        hasher.update(repr(settings).encode())
+
+        def hash_collection(collection, attr, typecode, count):
+            buf = array.array(typecode, [0]) * count
+            collection.foreach_get(attr, buf)
+            hasher.update(buf.tobytes())
+
+        # The smart project operator considers face angles, so the vertex positions must be
+        # part of the key, not just the connectivity.
+        hash_collection(mesh.vertices, "co", "f", len(mesh.vertices) * 3)
+        hash_collection(mesh.loops, "vertex_index", "i", len(mesh.loops))
+        hash_collection(mesh.polygons, "loop_total", "i", len(mesh.polygons))
+        if uv_base is not None:
+            hash_collection(uv_base.data, "uv", "f", len(mesh.loops) * 2)
+        return hasher.hexdigest()
+
     def _prep_for_lightmap_uvs(self, bo, image, toggle):
         mesh = bo.data
         modifier = bo.plasma_modifiers.lightmap
         uv_textures = mesh.uv_textures
 
-        # If there is a cached LIGHTMAPGEN uvtexture, nuke it
+        # Because the way Blender tracks active UV layers is massively stupid...
+        if uv_textures.active is not None:
+            self._uvtexs[mesh.name] = uv_textures.active.name
+
+        # If there is a LIGHTMAPGEN uvtexture that was generated from this very same geometry,
+        # we can skip the edit mode round trips entirely. Collapsed meshes inherit their UV
+        # textures from the original mesh, so we can't trust them.
+        collapsed = self._mesh.is_collapsed(bo)
+        uv_key = self._calc_lightmap_uv_key(bo)
         uvtex = uv_textures.get(self.lightmap_uvtex_name, None)
+        if uvtex is not None and not collapsed and modifier.uv_cache_key == uv_key:
+            self._report.msg("'{}': Reusing lightmap UV Texture", bo.name)
+            uv_textures.active = uvtex
+            self._associate_image_with_uvtex(uvtex, image)
+            _lightmap_uv_cache.pop(bo.name, None)
+            return
+
+        # Otherwise, nuke it
         if uvtex is not None:
             uv_textures.remove(uvtex)
 
+        cached_key, cached_uvs = _lightmap_uv_cache.get(bo.name, (None, None))
+        if cached_key == uv_key:
+            self._report.msg("'{}': Using cached lightmap UVs", bo.name)
+            uvtex = uv_textures.new(self.lightmap_uvtex_name)
+            uv_textures.active = uvtex
+            mesh.uv_layers[uvtex.name].data.foreach_set("uv", cached_uvs)
+            self._associate_image_with_uvtex(uvtex, image)
+        else:
+            self._unwrap_lightmap_uvs(bo, image, toggle)
+
+            # Collapsed meshes are ephemeral, so stash the UVs away for the next export.
+            # Everything else retains its UV texture in the blend file.
+            if collapsed:
+                uv_layer = mesh.uv_layers[self.lightmap_uvtex_name]
+                uvs = array.array("f", [0.0]) * (len(mesh.loops) * 2)
+                uv_layer.data.foreach_get("uv", uvs)
+                _lightmap_uv_cache[bo.name] = (uv_key, uvs)
+            else:
+                _lightmap_uv_cache.pop(bo.name, None)
+        modifier.uv_cache_key = uv_key
+
+    def _unwrap_lightmap_uvs(self, bo, image, toggle):
+        mesh = bo.data
+        modifier = bo.plasma_modifiers.lightmap
+        uv_textures = mesh.uv_textures
+
         # Make sure we can enter Edit Mode(TM)
         toggle.track(bo, "hide", False)
 
-        # Because the way Blender tracks active UV layers is massively stupid...
-        if uv_textures.active is not None:
-            self._uvtexs[mesh.name] = uv_textures.active.name
-
         # We must make this the active object before touching any operators
         bpy.context.scene.objects.active = bo
 
@@ -497,7 +802,7 @@ class LightBaker:
                 with self._set_mode("EDIT"):
                     bpy.ops.mesh.select_all(action="SELECT")
                     bpy.ops.uv.select_all(action="SELECT")
-                    bpy.ops.uv.pack_islands(margin=0.01)
+                    bpy.ops.uv.pack_islands(margin=_LIGHTMAP_PACK_MARGIN)
         else:
             # same thread, see Sirius's suggestion RE smart unwrap. this seems to yield good
             # results in my tests. it will be good enough for quick exports.
@@ -506,7 +811,7 @@ class LightBaker:
             self._associate_image_with_uvtex(uvtex, image)
             with self._set_mode("EDIT"):
                 bpy.ops.mesh.select_all(action="SELECT")
-                bpy.ops.uv.smart_project(island_margin=0.05)
+                bpy.ops.uv.smart_project(island_margin=_LIGHTMAP_ISLAND_MARGIN)
 
     def _prep_for_vcols(self, bo, toggle):
         mesh = bo.data
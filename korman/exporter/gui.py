@@ -18,6 +18,7 @@ from __future__ import annotations
 import bpy
 import mathutils
 
+from array import array
 from contextlib import contextmanager, ExitStack
 import itertools
 import math
@@ -45,17 +46,24 @@ class PostEffectModMatrices(NamedTuple):
     w2c: hsMatrix44
 
 
+class _GuiGeometry(NamedTuple):
+    normal: mathutils.Vector
+    bound_boxes: List[mathutils.Vector]
+
+
 class GuiConverter:
 
     if TYPE_CHECKING:
         _parent: weakref.ref[Exporter] = ...
         _pages: Dict[str, Any] = ...
         _mods_exported: Set[str] = ...
+        _geometry: Dict[Tuple[str, ...], _GuiGeometry] = ...
 
     def __init__(self, parent: Optional[Exporter] = None):
         self._parent = weakref.ref(parent) if parent is not None else None
         self._pages = {}
         self._mods_exported = set()
+        self._geometry = {}
 
         # Go ahead and prepare the GUI transparent material for future use.
         if parent is not None:
@@ -95,15 +103,8 @@ class GuiConverter:
         # give us some three dimensional crap as a GUI. Therefore, to come up with a camera matrix,
         # we'll use the average area-weighted inverse normal of all the polygons they give us. That
         # way, the camera *always* should face the GUI as would be expected.
-        remove_mesh = bpy.data.meshes.remove
-        avg_normal = mathutils.Vector()
-        for i in objects:
-            mesh = i.to_mesh(bpy.context.scene, True, "RENDER", calc_tessface=False)
-            with helpers.TemporaryObject(mesh, remove_mesh):
-                utils.transform_mesh(mesh, i.matrix_world)
-                for polygon in mesh.polygons:
-                    avg_normal += (polygon.normal * polygon.area)
-        avg_normal.normalize()
+        geometry = self._get_geometry(objects)
+        avg_normal = geometry.normal.normalized()
         avg_normal *= -1.0
 
         # From the inverse area weighted normal we found above, get the rotation from the up axis
@@ -127,10 +128,7 @@ class GuiConverter:
             camera.data.lens_unit = "FOV"
 
             # Get all of the bounding points and make sure they all fit inside the camera's view frame.
-            bound_boxes = [
-                obj.matrix_world * mathutils.Vector(bbox)
-                for obj in objects for bbox in obj.bound_box
-            ]
+            bound_boxes = geometry.bound_boxes
             co, _ = camera.camera_fit_coords(
                 scene,
                 # bound_box is a list of vectors of each corner of all the objects' bounding boxes;
@@ -181,10 +179,7 @@ class GuiConverter:
             # bounding boxes of the objects shown in the GUI.
             view_frame = [i * pose for i in camera.data.view_frame(scene)]
             cam_plane = mathutils.geometry.normal(view_frame)
-            bound_boxes = (
-                obj.matrix_world * mathutils.Vector(bbox)
-                for obj in objects for bbox in obj.bound_box
-            )
+            bound_boxes = self._get_geometry(objects).bound_boxes
             pos = pose.to_translation()
             bounds_dists = [
                 abs(mathutils.geometry.distance_point_to_plane(i, pos, cam_plane))
@@ -198,6 +193,47 @@ class GuiConverter:
                 yonder += 0.25
             return Clipping(hither, yonder)
 
+    def _get_geometry(self, objects: Sequence[bpy.types.Object]) -> _GuiGeometry:
+        """Gets the area-weighted normal and world space bounding boxes of a set of GUI objects.
+           This is cached because the camera fitting and clipping both need this data."""
+        key = tuple(i.name for i in objects)
+        geometry = self._geometry.get(key)
+        if geometry is None:
+            geometry = self._geometry[key] = self._calc_geometry(objects)
+        return geometry
+
+    def _calc_geometry(self, objects: Sequence[bpy.types.Object]) -> _GuiGeometry:
+        remove_mesh = bpy.data.meshes.remove
+        normal = mathutils.Vector()
+        for i in objects:
+            mesh = i.to_mesh(bpy.context.scene, True, "RENDER", calc_tessface=False)
+            with helpers.TemporaryObject(mesh, remove_mesh):
+                num_polygons = len(mesh.polygons)
+                normals = array("f", [0.0]) * (num_polygons * 3)
+                areas = array("f", [0.0]) * num_polygons
+                mesh.polygons.foreach_get("normal", normals)
+                mesh.polygons.foreach_get("area", areas)
+                local_normal = mathutils.Vector((sum(map(float.__mul__, normals[0::3], areas)),
+                                                 sum(map(float.__mul__, normals[1::3], areas)),
+                                                 sum(map(float.__mul__, normals[2::3], areas))))
+
+            # Rather than transforming every polygon into world space, transform the sum. An area
+            # weighted normal transforms by the cofactor matrix. We ignore the sign of the
+            # determinant because the normals of negatively scaled objects are flipped to match
+            # what Blender displays (see utils.transform_mesh).
+            matrix = i.matrix_world.to_3x3()
+            determinant = matrix.determinant()
+            if determinant == 0.0:
+                continue
+            cofactor = matrix.inverted().transposed() * abs(determinant)
+            normal += cofactor * local_normal
+
+        bound_boxes = [
+            obj.matrix_world * mathutils.Vector(bbox)
+            for obj in objects for bbox in obj.bound_box
+        ]
+        return _GuiGeometry(normal, bound_boxes)
+
     def convert_post_effect_matrices(self, camera_matrix: mathutils.Matrix) -> PostEffectModMatrices:
         # PostEffectMod matrices face *away* from the GUI... For some reason.
         # See plPostEffectMod::SetWorldToCamera()
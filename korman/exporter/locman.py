@@ -17,11 +17,10 @@ import bpy
 from PyHSPlasma import *
 
 from collections import defaultdict
-from contextlib import contextmanager
 import itertools
 from pathlib import Path
 import re
-from typing import NamedTuple, Union
+from typing import NamedTuple
 from xml.sax.saxutils import escape as xml_escape
 import weakref
 
@@ -39,21 +38,24 @@ _ESHTML_REGEX = re.compile("<.+>")
 # limitations in the Plasma font system.
 class _DumbCharacter(NamedTuple):
     desc: str
-    needle: Union[re.Pattern, str]
+    needle: str
     sub: str = ""
 
 
 _DUMB_CHARACTERS = [
     _DumbCharacter(
         "smart single quote (probably copypasta'd from Microsoft Word)",
-        re.compile("[\u2018\u2019\u201A\u201B]"), "'"
+        "\u2018\u2019\u201A\u201B", "'"
     ),
     _DumbCharacter(
         "smart double quote (probably copypasta'd from Microsoft Word)",
-        re.compile("[\u201C\u201D\u201E\u201F\u2E42]"), '"'
+        "\u201C\u201D\u201E\u201F\u2E42", '"'
     ),
 ]
 
+# All of the dumb characters folded into one table so strings only need a single pass.
+_DUMB_CHARACTER_TABLE = str.maketrans({ char: dc.sub for dc in _DUMB_CHARACTERS for char in dc.needle })
+
 
 class LocalizationConverter:
     def __init__(self, exporter=None, **kwargs):
@@ -77,51 +79,56 @@ class LocalizationConverter:
                                 element_name, language)
             value = value.as_string()
 
-        for dc in _DUMB_CHARACTERS:
-            old_value = value
-            if isinstance(dc.needle, str):
-                value = value.replace(dc.needle, dc.sub)
-            else:
-                value = dc.needle.sub(dc.sub, value)
-            if value != old_value:
-                self._report.warn(
-                    "'{}' translation for '{}' has an illegal {}, which was replaced with: {}",
-                    element_name, language, dc.desc, dc.sub
-                )
+        sanitized = value.translate(_DUMB_CHARACTER_TABLE)
+        if sanitized != value:
+            # Only figure out what was replaced in the rare case that something actually was.
+            for dc in _DUMB_CHARACTERS:
+                if any(char in value for char in dc.needle):
+                    self._report.warn(
+                        "'{}' translation for '{}' has an illegal {}, which was replaced with: {}",
+                        element_name, language, dc.desc, dc.sub
+                    )
+            value = sanitized
 
         self._strings[set_name][element_name][language] = value
 
-    @contextmanager
-    def _generate_file(self, filename, **kwargs):
+    def _write_file(self, filename, data, **kwargs):
         if self._exporter is not None:
-            with self._exporter().output.generate_dat_file(filename, **kwargs) as handle:
-                yield handle
+            written = self._exporter().output.add_dat_data(filename, data, **kwargs)
         else:
             dirname = kwargs.get("dirname", "dat")
-            filepath = str(Path(self._path) / dirname / filename)
-            handle = open(filepath, "wb")
-            try:
-                yield handle
-            except:
-                raise
-            finally:
-                handle.close()
+            filepath = Path(self._path) / dirname / filename
+            written = not self._is_file_current(filepath, data)
+            if written:
+                with filepath.open("wb") as handle:
+                    handle.write(data)
+        if not written:
+            self._report.msg("'{}' is already up to date", filename)
+
+    @staticmethod
+    def _is_file_current(filepath, data):
+        try:
+            if filepath.stat().st_size != len(data):
+                return False
+            return filepath.read_bytes() == data
+        except OSError:
+            return False
 
     def _generate_text_files(self):
         age_name = self._age_name
 
         def write_text_file(language, file_name, contents):
-            with self._generate_file(dirname="ageresources", filename=file_name) as stream:
-                try:
-                    stream.write(contents.encode("windows-1252"))
-                except UnicodeEncodeError:
-                    self._report.warn("Translation '{}': Contents contains characters that cannot be used in this version of Plasma. They will appear as a '?' in game.",
-                                    language)
-
-                    # Yes, there are illegal characters... As a stopgap, we will export the file with
-                    # replacement characters ("?") just so it'll work dammit.
-                    stream.write(contents.encode("windows-1252", "replace"))
-                return True
+            try:
+                data = contents.encode("windows-1252")
+            except UnicodeEncodeError:
+                self._report.warn("Translation '{}': Contents contains characters that cannot be used in this version of Plasma. They will appear as a '?' in game.",
+                                language)
+
+                # Yes, there are illegal characters... As a stopgap, we will export the file with
+                # replacement characters ("?") just so it'll work dammit.
+                data = contents.encode("windows-1252", "replace")
+            self._write_file(dirname="ageresources", filename=file_name, data=data)
+            return True
 
         locs = itertools.chain(self._strings["Journals"].items(), self._strings["DynaTexts"].items())
         for journal_name, translations in locs:
@@ -176,50 +183,47 @@ class LocalizationConverter:
             raise RuntimeError("Unexpected localization method {}".format(method))
 
     def _generate_loc_file(self, filename, sets, language_name=None):
-        def write_line(value, *args, **kwargs):
-            # tabs suck, then you die...
-            whitespace = "    " * kwargs.pop("indent", 0)
-            if args or kwargs:
-                value = value.format(*args, **kwargs)
-            line = "".join((whitespace, value, "\n"))
-            stream.write(line.encode("utf-8"))
-
         def iter_element(element):
             if language_name is None:
                 yield from sorted(element.items())
             else:
                 yield language_name, element
 
+        # The whole document is assembled before anything is written so that an identical
+        # file that is already on the disk can be left alone. Tabs suck, then you die...
+        lines = [
+            "<?xml version=\"1.0\" encoding=\"utf-8\"?>",
+            "<localizations>",
+            "    <age name=\"{}\">".format(self._age_name),
+        ]
+        for set_name, elements in sorted(sets.items()):
+            lines.append("        <set name=\"{}\">".format(set_name))
+            for element_name, value in sorted(elements.items()):
+                lines.append("            <element name=\"{}\">".format(element_name))
+                for translation_language, translation_value in iter_element(value):
+                    if _ESHTML_REGEX.search(translation_value):
+                        encoded_value = "<![CDATA[{}]]>".format(translation_value)
+                    else:
+                        encoded_value = xml_escape(translation_value)
+                    lines.append("                <translation language=\"{}\">{}</translation>".format(
+                                 translation_language, encoded_value))
+                lines.append("            </element>")
+            lines.append("        </set>")
+
+        # Verbose XML junk...
+        # <Deledrius> You call it verbose.  I call it unambiguously complete.
+        lines.append("    </age>")
+        lines.append("</localizations>")
+        lines.append("")
+
         enc = plEncryptedStream.kEncAes if self._version == pvEoa else None
-        with self._generate_file(filename, enc=enc) as stream:
-            write_line("<?xml version=\"1.0\" encoding=\"utf-8\"?>")
-            write_line("<localizations>")
-            write_line("<age name=\"{}\">", self._age_name, indent=1)
-
-            for set_name, elements in sorted(sets.items()):
-                write_line("<set name=\"{}\">", set_name, indent=2)
-                for element_name, value in sorted(elements.items()):
-                    write_line("<element name=\"{}\">", element_name, indent=3)
-                    for translation_language, translation_value in iter_element(value):
-                        if _ESHTML_REGEX.search(translation_value):
-                            encoded_value = "<![CDATA[{}]]>".format(translation_value)
-                        else:
-                            encoded_value = xml_escape(translation_value)
-                        write_line("<translation language=\"{language}\">{translation}</translation>",
-                                   language=translation_language, translation=encoded_value, indent=4)
-                    write_line("</element>", indent=3)
-                write_line("</set>", indent=2)
-
-            # Verbose XML junk...
-            # <Deledrius> You call it verbose.  I call it unambiguously complete.
-            write_line("</age>", indent=1)
-            write_line("</localizations>")
+        self._write_file(filename, "\n".join(lines).encode("utf-8"), enc=enc)
 
     def run(self):
         age_props = bpy.context.scene.world.plasma_age
         loc_path = str(Path(self._path) / "dat" / "{}.loc".format(self._age_name))
         log = logger.ExportVerboseLogger if age_props.verbose else logger.ExportProgressLogger
-        with korlib.ConsoleToggler(age_props.show_console), log(loc_path) as self._report:
+        with korlib.ConsoleToggler(age_props.show_console), log(loc_path, age_props.log_level, age_props.event_log, age_props.live_progress) as self._report:
             self._report.progress_add_step("Harvesting Translations")
             self._report.progress_add_step("Generating Localization")
             self._report.progress_start("Exporting Localization Data")
@@ -232,22 +236,18 @@ class LocalizationConverter:
             self._report.raise_errors()
 
     def _run_harvest_journals(self):
-        from ..properties.modifiers import TranslationMixin
-
         objects = bpy.context.scene.objects
         self._report.progress_advance()
         self._report.progress_range = len(objects)
         inc_progress = self._report.progress_increment
 
         for i in objects:
-            for mod_type in filter(None, (getattr(j, "pl_id", None) for j in TranslationMixin.__subclasses__())):
-                modifier = getattr(i.plasma_modifiers, mod_type)
-                if modifier.enabled:
-                    translations = [j for j in modifier.translations if j.text_id is not None]
-                    if not translations:
-                        self._report.error(f"'{i.name}': No content translations available. The localization will not be exported.")
-                    for j in translations:
-                        self.add_string(modifier.localization_set, modifier.key_name, j.language, j.text_id)
+            for modifier in i.plasma_modifiers.translatable_modifiers:
+                translations = [j for j in modifier.translations if j.text_id is not None]
+                if not translations:
+                    self._report.error(f"'{i.name}': No content translations available. The localization will not be exported.")
+                for j in translations:
+                    self.add_string(modifier.localization_set, modifier.key_name, j.language, j.text_id)
             inc_progress()
 
     def _run_generate(self):
@@ -16,6 +16,7 @@
 from __future__ import annotations
 
 from contextlib import contextmanager
+import json
 from pathlib import Path
 import threading
 import time
@@ -30,33 +31,168 @@ from .explosions import NonfatalExportError
 _HEADING_SIZE = 60
 _MAX_ELIPSES = 3
 _MAX_TIME_UNTIL_ELIPSES = 2.0
+_MIN_TIME_UNTIL_ETA = 2.0
+_PROGRESS_REFRESH_INTERVAL = 0.1
+
+# Log lines are buffered and written out in batches by a background thread. If the writer
+# falls this far behind, whoever is logging drains the buffer instead of letting it grow.
+_LOG_BATCH_SIZE = 256
+_LOG_BUFFER_SIZE = 4096
+_LOG_FLUSH_INTERVAL = 0.5
+
+# Arguments of these types can't change behind our backs, so formatting them can be deferred
+# to the writer thread. Anything else (eg Blender data) is formatted immediately.
+_LAZY_FORMAT_TYPES = frozenset((str, int, float, bool, type(None)))
 
 class _ExportLogger:
-    def __init__(self, print_logs: bool, age_path: Optional[str] = None):
+    def __init__(self, print_logs: bool, age_path: Optional[str] = None, log_level: str = "all",
+                 event_log: bool = False, live_progress: bool = True):
         self._errors: List[str] = []
         self._porting: List[str] = []
         self._warnings: List[str] = []
         self._age_path = Path(age_path) if age_path is not None else None
         self._file: Optional[TextIOWrapper] = None
+        self._event_file: Optional[TextIOWrapper] = None
+        self._want_event_log = event_log
         self._print_logs = print_logs
+        self._log_messages = log_level == "all"
+        self._live_progress = live_progress
+        self._time_created = time.perf_counter()
         self._time_start_overall: float = 0.0
         self._indent_level: int = 0
 
+        # Progress manager
+        self._progress_steps = []
+        self._step_event_open = False
+        self._step_id = -1
+        self._step_max = 0
+        self._step_progress = 0
+        self._time_start_step = 0
+
+        self._buffer = []
+        self._buffer_condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_alive = False
+
     def __enter__(self):
         if self._age_path is not None:
             # Make the log file name from the age file path -- this ensures we're not trying to write
             # the log file to the same directory Blender.exe is in, which might be a permission error
             my_path = self._age_path.with_name("{}_export".format(self._age_path.stem)).with_suffix(".log")
             self._file = open(str(my_path), "w")
+            if self._want_event_log:
+                self._event_file = open(str(my_path.with_suffix(".jsonl")), "w")
+        if self._file is not None or self._event_file is not None or self._print_logs:
+            self._writer_alive = True
+            self._writer = threading.Thread(target=self._writer_thread, daemon=True)
+            self._writer.start()
         return self
 
     def __exit__(self, type, value, traceback):
         if value is not None:
             ConsoleToggler().keep_console = not isinstance(value, NonfatalExportError)
+            self.event("export_aborted", message=str(value))
+        self._stop_writer()
         if self._file is not None:
             self._file.close()
+        if self._event_file is not None:
+            self._event_file.close()
         return False
 
+    def event(self, event: str, **kwargs):
+        """Records an event in the machine-readable event log, if one is being written."""
+        if self._event_file is None:
+            return
+        self._log_record({"event": event, "time": round(time.perf_counter() - self._time_created, 6), **kwargs})
+
+    @property
+    def events_enabled(self) -> bool:
+        return self._event_file is not None
+
+    @contextmanager
+    def event_timer(self, event: str, **kwargs):
+        """Records an event with the time spent in the context, if an event log is being written."""
+        if self._event_file is None:
+            yield
+        else:
+            start = time.perf_counter()
+            yield
+            self.event(event, seconds=round(time.perf_counter() - start, 6), **kwargs)
+
+    def _flush_buffer(self):
+        # Holding the write lock while swapping out the buffer keeps the batches in order.
+        with self._write_lock:
+            with self._buffer_condition:
+                if not self._buffer:
+                    return
+                records, self._buffer = self._buffer, []
+            self._write_records(records)
+
+    def _log(self, prefix: str, args, kwargs):
+        indent = kwargs.get("indent", self._indent_level)
+        fmt, fmt_args = args[0], args[1:]
+        if fmt_args:
+            if not (all(type(i) in _LAZY_FORMAT_TYPES for i in fmt_args) and
+                    all(type(i) in _LAZY_FORMAT_TYPES for i in kwargs.values())):
+                fmt, fmt_args = fmt.format(*fmt_args, **kwargs), ()
+        self._log_record((indent, prefix, fmt, fmt_args, kwargs))
+
+    def _log_record(self, record):
+        if self._writer is None:
+            if self._file is not None or self._event_file is not None or self._print_logs:
+                self._write_records((record,))
+            return
+
+        with self._buffer_condition:
+            self._buffer.append(record)
+            num_records = len(self._buffer)
+            if num_records == _LOG_BATCH_SIZE:
+                self._buffer_condition.notify()
+        if num_records >= _LOG_BUFFER_SIZE:
+            self._flush_buffer()
+
+    def _stop_writer(self):
+        if self._writer is not None:
+            with self._buffer_condition:
+                self._writer_alive = False
+                self._buffer_condition.notify()
+            self._writer.join()
+            self._writer = None
+        self._flush_buffer()
+
+    def _write_records(self, records):
+        lines, events = [], []
+        for record in records:
+            # Events are dicts, everything else is a log line.
+            if type(record) is dict:
+                events.append(json.dumps(record, default=str))
+                continue
+            indent, prefix, fmt, fmt_args, kwargs = record
+            msg = f"{'    ' * indent}{prefix}{fmt}"
+            if fmt_args:
+                try:
+                    msg = msg.format(*fmt_args, **kwargs)
+                except (IndexError, KeyError, ValueError) as e:
+                    # Don't let one botched message take down the writer thread.
+                    msg = f"{msg} {fmt_args!r} (bad log message: {e})"
+            lines.append(msg)
+        if events and self._event_file is not None:
+            self._event_file.writelines(("\n".join(events), "\n"))
+        if lines:
+            text = "\n".join(lines)
+            if self._file is not None:
+                self._file.writelines((text, "\n"))
+            if self._print_logs:
+                print(text)
+
+    def _writer_thread(self):
+        while self._writer_alive:
+            with self._buffer_condition:
+                if self._writer_alive and len(self._buffer) < _LOG_BATCH_SIZE:
+                    self._buffer_condition.wait(timeout=_LOG_FLUSH_INTERVAL)
+            self._flush_buffer()
+
     @contextmanager
     def indent(self):
         try:
@@ -71,55 +207,50 @@ class _ExportLogger:
 
     def error(self, *args, **kwargs):
         assert args
-        indent = kwargs.get("indent", self._indent_level)
-        msg = f"{'    ' * indent}ERROR: {args[0]}"
-        if len(args) > 1:
-            msg = msg.format(*args[1:], **kwargs)
-        if self._file is not None:
-            self._file.writelines((msg, "\n"))
-        if self._print_logs:
-            print(msg)
-        cache = args[0] if len(args) == 1 else args[0].format(*args[1:])
-        self._errors.append(cache)
+        msg = args[0] if len(args) == 1 else args[0].format(*args[1:], **kwargs)
+        self._log_record((kwargs.get("indent", self._indent_level), "ERROR: ", msg, (), {}))
+        self._errors.append(msg)
+        self.event("error", message=msg)
 
     def msg(self, *args, **kwargs):
         assert args
-        indent = kwargs.get("indent", self._indent_level)
-        msg = f"{'    ' * indent}{args[0]}"
-        if len(args) > 1:
-            msg = msg.format(*args[1:], **kwargs)
-        if self._file is not None:
-            self._file.writelines((msg, "\n"))
-        if self._print_logs:
-            print(msg)
+        if self._log_messages:
+            self._log("", args, kwargs)
 
     def port(self, *args, **kwargs):
         assert args
-        indent = kwargs.get("indent", self._indent_level)
-        msg = f"{'    ' * indent}PORTNING: {args[0]}"
-        if len(args) > 1:
-            msg = msg.format(*args[1:], **kwargs)
-        if self._file is not None:
-            self._file.writelines((msg, "\n"))
-        if self._print_logs:
-            print(msg)
-        cache = args[0] if len(args) == 1 else args[0].format(*args[1:])
-        self._porting.append(cache)
+        msg = args[0] if len(args) == 1 else args[0].format(*args[1:], **kwargs)
+        self._log_record((kwargs.get("indent", self._indent_level), "PORTNING: ", msg, (), {}))
+        self._porting.append(msg)
+        self.event("porting", message=msg)
 
 
     def progress_add_step(self, name):
-        pass
+        self._progress_steps.append(name)
 
     def progress_advance(self):
-        pass
+        self._event_step_end()
+        self._step_id += 1
+        self._time_start_step = time.perf_counter()
+        if self._event_file is not None:
+            self._step_event_open = True
+            self.event("step_start", step=self._progress_steps[self._step_id])
 
     def progress_complete_step(self):
-        pass
+        self._event_step_end()
 
     def progress_end(self):
+        self._event_step_end()
+        export_time = time.perf_counter() - self._time_start_overall
         if self._age_path is not None:
-            export_time = time.perf_counter() - self._time_start_overall
             self.msg(f"\nExported '{self._age_path.name}' in {export_time:.2f}s")
+        self.event("export_end", seconds=round(export_time, 6))
+
+    def _event_step_end(self):
+        if self._step_event_open:
+            self._step_event_open = False
+            self.event("step_end", step=self._progress_steps[self._step_id], items=self._step_progress,
+                       seconds=round(time.perf_counter() - self._time_start_step, 6))
 
     def progress_increment(self):
         pass
@@ -128,6 +259,8 @@ class _ExportLogger:
         if self._age_path is not None:
             self.msg(f"Exporting '{self._age_path.name}'")
         self._time_start_overall = time.perf_counter()
+        self.event("export_start", action=action,
+                   path=str(self._age_path) if self._age_path is not None else None)
 
     def raise_errors(self):
         num_errors = len(self._errors)
@@ -143,21 +276,15 @@ class _ExportLogger:
 
     def warn(self, *args, **kwargs):
         assert args
-        indent = kwargs.get("indent", self._indent_level)
-        msg = f"{'    ' * indent}WARNING: {args[0]}"
-        if len(args) > 1:
-            msg = msg.format(*args[1:], **kwargs)
-        if self._file is not None:
-            self._file.writelines((msg, "\n"))
-        if self._print_logs:
-            print(msg)
-        cache = args[0] if len(args) == 1 else args[0].format(*args[1:])
-        self._warnings.append(cache)
+        msg = args[0] if len(args) == 1 else args[0].format(*args[1:], **kwargs)
+        self._log_record((kwargs.get("indent", self._indent_level), "WARNING: ", msg, (), {}))
+        self._warnings.append(msg)
+        self.event("warning", message=msg)
 
 
 class ExportProgressLogger(_ExportLogger):
-    def __init__(self, age_path=None):
-        super().__init__(False, age_path)
+    def __init__(self, age_path=None, log_level="all", event_log=False, live_progress=True):
+        super().__init__(False, age_path, log_level, event_log, live_progress)
 
         # Long running operations like the Blender bake_image call make it seem like we've hung
         # because it is difficult to inspect the progress of Blender's internal operators. The best
@@ -167,21 +294,22 @@ class ExportProgressLogger(_ExportLogger):
         self._thread = threading.Thread(target=self._progress_thread)
         self._queued_lines = []
         self._print_condition = threading.Condition()
-        self._volatile_line = ""
 
         # Progress manager
+        # NOTE: the progress counters are only ever bumped here -- the printer thread samples
+        # them at a fixed rate, so the cost of reporting progress doesn't depend on the item count.
+        # Without live progress, the printer thread only wakes up when a step starts or ends.
         self._progress_alive = False
-        self._progress_steps = []
-        self._step_id = -1
-        self._step_max = 0
-        self._step_progress = 0
-        self._time_start_step = 0
+        self._progress_wake = False
+        self._step_active = False
+        self._step_headers = []
 
     def __exit__(self, type, value, traceback):
         if value is not None:
             export_time = time.perf_counter() - self._time_start_overall
             with self._print_condition:
-                self._progress_print_step(done=(self._step_progress == self._step_max), error=True)
+                if self._step_id != -1 and self._step_headers:
+                    self._progress_print_step(done=(self._step_progress == self._step_max), error=True)
                 self._progress_print_line("\nABORTED AFTER {:.2f}s".format(export_time))
                 self._progress_print_heading("ERROR")
                 self._progress_print_line(str(value))
@@ -191,7 +319,7 @@ class ExportProgressLogger(_ExportLogger):
 
     def progress_add_step(self, name):
         assert self._step_id == -1
-        self._progress_steps.append(name)
+        super().progress_add_step(name)
 
     def progress_advance(self):
         """Advances the progress bar to the next step"""
@@ -199,20 +327,21 @@ class ExportProgressLogger(_ExportLogger):
             self._progress_print_step(done=True)
         assert self._step_id < len(self._progress_steps)
 
-        self._step_id += 1
+        super().progress_advance()
         self._step_max = 0
         self._step_progress = 0
-        self._time_start_step = time.perf_counter()
         self._progress_print_step()
 
     def progress_complete_step(self):
         """Manually completes the current step"""
         assert self._step_id != -1
+        super().progress_complete_step()
         self._progress_print_step(done=True)
 
     def progress_end(self):
         self._progress_print_step(done=True)
         assert self._step_id+1 == len(self._progress_steps)
+        self._event_step_end()
 
         export_time = time.perf_counter() - self._time_start_overall
         with self._print_condition:
@@ -221,6 +350,7 @@ class ExportProgressLogger(_ExportLogger):
                 self._progress_print_line("\nEXPORTED '{}' IN {:.2f}s".format(self._age_path.name, export_time))
             else:
                 self._progress_print_line("\nCOMPLETED IN {:.2f}s".format(export_time))
+            self.event("export_end", seconds=round(export_time, 6))
             self._progress_print_heading()
             self._progress_print_line("")
             self._progress_alive = False
@@ -231,19 +361,29 @@ class ExportProgressLogger(_ExportLogger):
 
     def progress_increment(self):
         """Increments the progress of the current step"""
-        assert self._step_id != -1
         self._step_progress += 1
-        if self._step_max != 0:
-            self._progress_print_step()
+
+    def _progress_format_stage(self):
+        step_max, step_progress = self._step_max, self._step_progress
+        if step_max == 0 or step_progress == 0:
+            return ""
+
+        stage = "{} of {}".format(step_progress, step_max)
+        if not self._live_progress:
+            return stage
+
+        # Guess how much longer this is going to take from how the step has gone so far. Early on,
+        # there's not enough history to make a guess worth showing.
+        elapsed = time.perf_counter() - self._time_start_step
+        if elapsed >= _MIN_TIME_UNTIL_ETA and step_progress < step_max:
+            remaining = elapsed / step_progress * (step_max - step_progress)
+            stage = "{} (about {:.0f}s left)".format(stage, remaining)
+        return stage
 
     def _progress_print_line(self, line):
         with self._print_condition:
             self._queued_lines.append(line)
-            self._print_condition.notify()
-
-    def _progress_print_volatile(self, line):
-        with self._print_condition:
-            self._volatile_line = line
+            self._progress_wake = True
             self._print_condition.notify()
 
     def _progress_print_heading(self, text=None):
@@ -258,44 +398,39 @@ class ExportProgressLogger(_ExportLogger):
 
     def _progress_print_step(self, done=False, error=False):
         with self._print_condition:
+            # ALLLLL ABOARD!!!!! HAHAHAHA
             if done:
+                self._step_active = False
                 stage = "DONE IN {:.2f}s".format(time.perf_counter() - self._time_start_step)
-                print_func = self._progress_print_line
-                self._progress_print_volatile("")
+                self._progress_print_line("".join((self._step_headers[self._step_id], stage)))
+            elif error:
+                self._step_active = False
+                self._progress_print_line("".join((self._step_headers[self._step_id], self._progress_format_stage())))
             else:
-                if self._step_max != 0 and self._step_progress != 0:
-                    stage = "{} of {}".format(self._step_progress, self._step_max)
-                else:
-                    stage = ""
-                print_func = self._progress_print_line if error else self._progress_print_volatile
-
-            # ALLLLL ABOARD!!!!! HAHAHAHA
-            step_name = self._progress_steps[self._step_id]
-            whitespace = ' ' * (self._step_spacing - len(step_name))
-            num_steps = len(self._progress_steps)
-            step_id = self._step_id + 1
-            stage_max_whitespace = len(str(num_steps)) * 2
-            stage_space_used = len(str(step_id)) + len(str(num_steps))
-            stage_whitespace = ' ' * (stage_max_whitespace - stage_space_used + 1)
-            # f-strings would be nice here...
-            line = "{step_name}{step_whitespace}(step {step_id}/{num_steps}):{stage_whitespace}{stage}".format(
-                step_name=step_name, step_whitespace=whitespace, step_id=step_id, num_steps=num_steps,
-                stage_whitespace=stage_whitespace, stage=stage)
-            print_func(line)
+                # The printer thread will pick this up on its own.
+                self._step_active = True
+                self._progress_wake = True
+                self._print_condition.notify()
 
     def _progress_get_max(self):
         return self._step_max
     def _progress_set_max(self, value):
         assert self._step_id != -1
         self._step_max = value
-        self._progress_print_step()
     progress_range = property(_progress_get_max, _progress_set_max)
 
     def progress_start(self, action):
         super().progress_start(action)
 
-        # Need to know the spacing for this junk
-        self._step_spacing = max((len(i) for i in self._progress_steps)) + 4
+        # The step headers never change, so there's no sense in building them on every refresh.
+        step_spacing = max((len(i) for i in self._progress_steps)) + 4
+        num_steps = len(self._progress_steps)
+        stage_max_whitespace = len(str(num_steps)) * 2
+        for step_id, step_name in enumerate(self._progress_steps, 1):
+            whitespace = ' ' * (step_spacing - len(step_name))
+            stage_space_used = len(str(step_id)) + len(str(num_steps))
+            stage_whitespace = ' ' * (stage_max_whitespace - stage_space_used + 1)
+            self._step_headers.append(f"{step_name}{whitespace}(step {step_id}/{num_steps}):{stage_whitespace}")
 
         # Begin displaying the progress console
         self._progress_print_heading("Korman")
@@ -304,12 +439,42 @@ class ExportProgressLogger(_ExportLogger):
         self._thread.start()
 
     def _progress_thread(self):
-        num_dots = 0
+        last_line = ""
+        last_progress = None
+        time_last_progress = time.perf_counter()
         self._cursor.update()
 
         while self._progress_alive:
             with self._print_condition:
-                signalled = self._print_condition.wait(timeout=1.0)
+                if self._live_progress:
+                    self._print_condition.wait(timeout=_PROGRESS_REFRESH_INTERVAL)
+                else:
+                    self._print_condition.wait_for(lambda: self._progress_wake or not self._progress_alive)
+                self._progress_wake = False
+
+                # Sample the current step, if any.
+                if self._step_active:
+                    now = time.perf_counter()
+                    progress = (self._step_id, self._step_progress, self._step_max)
+                    if progress != last_progress:
+                        last_progress = progress
+                        time_last_progress = now
+
+                    # If the proc is long running, let us display some elipses so as to not alarm the user
+                    stalled_time = now - time_last_progress
+                    if stalled_time > _MAX_TIME_UNTIL_ELIPSES:
+                        num_dots = int(stalled_time - _MAX_TIME_UNTIL_ELIPSES) % (_MAX_ELIPSES + 1)
+                    else:
+                        num_dots = 0
+                    line = "".join((self._step_headers[self._step_id], self._progress_format_stage(),
+                                    '.' * num_dots, ' ' * (_MAX_ELIPSES - num_dots)))
+                else:
+                    line = ""
+
+                # Don't bother redrawing if nothing visible has changed.
+                if not self._queued_lines and line == last_line:
+                    continue
+                last_line = line
                 print(end='\r')
 
                 # First, we need to print out any queued whole lines.
@@ -320,19 +485,11 @@ class ExportProgressLogger(_ExportLogger):
                         self._queued_lines.clear()
 
                 # Now, we need to print out the current volatile line, if any.
-                if self._volatile_line:
+                if line:
                     # On Windows, if we clear the line, the volatile line is nuked as well.
                     # Probably a race condition in the Win32 console host.
                     self._cursor.reset()
-                    print(self._volatile_line, end="")
-
-                    # If the proc is long running, let us display some elipses so as to not alarm the user
-                    if self._time_start_step != 0:
-                        if (time.perf_counter() - self._time_start_step) > _MAX_TIME_UNTIL_ELIPSES:
-                            num_dots = 0 if signalled or num_dots == _MAX_ELIPSES else num_dots + 1
-                        else:
-                            num_dots = 0
-                    print('.' * num_dots, end=" " * (_MAX_ELIPSES - num_dots))
+                    print(line, end="")
                     self._cursor.update()
 
     def _progress_get_current(self):
@@ -340,20 +497,19 @@ class ExportProgressLogger(_ExportLogger):
     def _progress_set_current(self, value):
         assert self._step_id != -1
         self._step_progress = value
-        if self._step_max != 0:
-            self._progress_print_step()
     progress_value = property(_progress_get_current, _progress_set_current)
 
 
 class ExportVerboseLogger(_ExportLogger):
-    def __init__(self, age_path=None):
-        super().__init__(True, age_path)
+    def __init__(self, age_path=None, log_level="all", event_log=False, live_progress=True):
+        super().__init__(True, age_path, log_level, event_log, live_progress)
         self.progress_range = 0
         self.progress_value = 0
 
     def __exit__(self, type, value, traceback):
         if value is not None:
+            # This goes around msg() so that the failure is logged at every log level.
             export_time = time.perf_counter() - self._time_start_overall
-            self.msg("\nAborted after {:.2f}s", export_time)
-            self.msg("Error: {}", value)
+            self._log("", ("\nAborted after {:.2f}s", export_time), {})
+            self._log("ERROR: ", ("{}", value), {})
         return super().__exit__(type, value, traceback)
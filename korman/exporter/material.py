@@ -1088,6 +1088,7 @@ class MaterialConverter:
 
                     # Mayhaps we have a cached version of this that has already been exported
                     cached_image = texcache.get_from_texture(key, compression)
+                    self._report.event("cache", cache="texture", name=name, hit=cached_image is not None)
 
                     if cached_image is None:
                         numLevels, width, height, data = self._finalize_cache(texcache, key, image, name, compression, dxt)
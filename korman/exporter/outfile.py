@@ -22,6 +22,8 @@ import locale
 import os
 from pathlib import Path, PurePath, PureWindowsPath
 from ..plasma_magic import plasma_python_glue
+from .python import compyle_cached
+from . import utils
 from PyHSPlasma import *
 import shutil
 import time
@@ -288,6 +290,51 @@ class OutputFiles:
             if isinstance(backing_stream, hsFileStream):
                 backing_stream.close()
 
+    def add_dat_data(self, filename, data, **kwargs):
+        """Adds a generated file whose contents are already known. If the file is already on
+           the disk with exactly these contents, it is left untouched. Returns whether or not
+           the file was written."""
+        dat_only = self._exporter().dat_only
+        dirname = kwargs.get("dirname", "dat")
+        if not self._is_zip and not (dat_only and dirname != "dat"):
+            if dat_only:
+                file_path = self._export_file.parent.joinpath(filename)
+            else:
+                file_path = self._export_path.joinpath(dirname, filename)
+            enc = kwargs.get("enc", None) if self._version != pvMoul else None
+            if self._is_dat_file_current(str(file_path), data, enc):
+                self._files.add(_OutputFile(file_type=_FileType.generated_dat if dirname == "dat" else
+                                                      _FileType.generated_ancillary,
+                                            dirname=dirname, filename=filename,
+                                            file_path=str(file_path),
+                                            skip_hash=kwargs.get("skip_hash", False),
+                                            internal=kwargs.get("internal", False)))
+                return False
+
+        with self.generate_dat_file(filename, **kwargs) as stream:
+            stream.write(data)
+        return True
+
+    def _is_dat_file_current(self, file_path, data, enc):
+        if not os.path.isfile(file_path):
+            return False
+        try:
+            # Leftovers from exporting for another game may have the right contents but the
+            # wrong encryption, so they must be replaced.
+            if utils.file_encryption(file_path) != enc:
+                return False
+            if enc is None:
+                if os.path.getsize(file_path) != len(data):
+                    return False
+                stream = hsFileStream(self._version).open(file_path, fmRead)
+            else:
+                stream = plEncryptedStream(self._version).open(file_path, fmRead, plEncryptedStream.kEncAuto)
+            with stream:
+                return stream.size == len(data) and stream.read(stream.size) == data
+        except Exception:
+            # Whatever is there is not something we can read, so it will just get overwritten.
+            return False
+
     def _generate_files(self, func=None):
         dat_only = self._exporter().dat_only
         for i in self._files:
@@ -313,15 +360,15 @@ class OutputFiles:
             py_version = (2, 3)
 
         try:
-            pyc_objects = []
+            py_files = []
             for i in self._generate_files(func):
                 if i.needs_glue:
                     py_code = "{}\n\n{}\n".format(i.file_data, plasma_python_glue)
                 else:
                     py_code = i.file_data
-                result, pyc = korlib.compyle(i.filename, py_code, py_version, report)
-                if result:
-                    pyc_objects.append((i.filename, pyc))
+                py_files.append((i.filename, py_code))
+            results = compyle_cached(py_files, py_version, report)
+            pyc_objects = [(filename, pyc) for (filename, _), (result, pyc) in zip(py_files, results) if result]
         except korlib.PythonNotAvailableError as error:
             report.warn(f"Python {error} is not available. Your Age scripts were not packaged.")
         else:
@@ -353,6 +400,10 @@ class OutputFiles:
         else:
             self._write_deps()
 
+        # Step 4: Let the build farm know how big everything is
+        if self._exporter().report.events_enabled:
+            self._report_file_sizes()
+
     @property
     def super_secure_encryption(self):
         version = self._version
@@ -364,6 +415,22 @@ class OutputFiles:
         else:
             return plEncryptedStream.kEncXtea
 
+    def _report_file_sizes(self):
+        report = self._exporter().report
+        for i in self._generate_files(lambda x: not x.internal):
+            file_data = getattr(i, "file_data", None)
+            if file_data is not None:
+                size = len(file_data.encode(_encoding) if isinstance(file_data, str) else file_data)
+            elif i.file_path:
+                try:
+                    size = os.path.getsize(i.file_path)
+                except OSError:
+                    size = None
+            else:
+                size = None
+            report.event("output_file", path=str(PurePath(i.dirname, i.filename)),
+                         file_type=i.file_type.name, size=size)
+
     def want_py_text(self, text_id):
         if text_id is None:
             return False
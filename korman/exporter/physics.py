@@ -13,6 +13,7 @@
 #    You should have received a copy of the GNU General Public License
 #    along with Korman.  If not, see <http://www.gnu.org/licenses/>.
 
+from array import array
 import bmesh
 import bpy
 import itertools
@@ -39,6 +40,11 @@ class PhysicsConverter:
             "trimesh": self._export_trimesh,
         }
 
+        # Instanced colliders frequently share the same mesh, so the converted collision
+        # geometry is cached and shared between physicals with the same shape.
+        self._geometry_cache = {}
+        self._node_targets = None
+
     def _apply_props(self, simIface, physical, props):
         for i in props.get("properties", []):
             _set_phys_prop(getattr(plSimulationInterface, i), simIface, physical)
@@ -50,42 +56,129 @@ class PhysicsConverter:
             physical.collideGroup |= 1 << getattr(plSimDefs, i)
 
     def _convert_indices(self, mesh):
-        indices = []
-        for face in mesh.tessfaces:
-            v = face.vertices
-            if len(v) == 3:
-                indices += v
-            elif len(v) == 4:
-                indices += (v[0], v[1], v[2],)
-                indices += (v[0], v[2], v[3],)
-        return indices
+        num_faces = len(mesh.tessfaces)
+        faces = array("i", [0]) * (num_faces * 4)
+        mesh.tessfaces.foreach_get("vertices_raw", faces)
+
+        # Every face contributes its first triangle. A zero fourth index means the face is a
+        # triangle, otherwise it is a quad that has to be split into a second triangle.
+        indices = array("i", [0]) * (num_faces * 3)
+        indices[0::3], indices[1::3], indices[2::3] = faces[0::4], faces[1::4], faces[2::4]
+        quads = [i for i in range(0, num_faces * 4, 4) if faces[i+3]]
+        if quads:
+            indices.extend(itertools.chain.from_iterable((faces[i], faces[i+2], faces[i+3]) for i in quads))
+        return indices.tolist()
+
+    def _convert_vertices(self, mesh, z_coord=None):
+        coords = self._read_coords(mesh)
+        z_coords = coords[2::3] if z_coord is None else itertools.repeat(z_coord)
+        return list(map(hsVector3, coords[0::3], coords[1::3], z_coords))
+
+    def _read_coords(self, mesh):
+        coords = array("f", [0.0]) * (len(mesh.vertices) * 3)
+        mesh.vertices.foreach_get("co", coords)
+        return coords
 
     def _convert_mesh_data(self, bo, physical, local_space, mat, indices=True):
+        if indices:
+            return self._convert_trimesh_data(bo, physical, local_space, mat)[:2]
+
+        if local_space:
+            physical.pos = hsVector3(*mat.to_translation())
+            physical.rot = utils.quaternion(mat.to_quaternion())
+
+        key = self._get_geometry_key(bo, "verts", local_space, mat)
+        vertices = self._geometry_cache.get(key)
+        if vertices is None:
+            vertices = self._geometry_cache[key] = self._read_mesh_data(bo, local_space, mat, False)[0]
+        return vertices
+
+    def _convert_trimesh_data(self, bo, physical, local_space, mat, simplify=None):
+        """Converts an object's triangle mesh, optionally simplifying it according to the
+           settings of a collision modifier. Returns the vertices, the indices, and the number
+           of triangles in the original mesh."""
+        if local_space:
+            physical.pos = hsVector3(*mat.to_translation())
+            physical.rot = utils.quaternion(mat.to_quaternion())
+
+        key = self._get_geometry_key(bo, "trimesh", local_space, mat)
+        if simplify is not None:
+            key += (simplify.simplify_target, simplify.simplify_angle, simplify.simplify_weld)
+        geometry = self._geometry_cache.get(key)
+        if geometry is None:
+            geometry = self._geometry_cache[key] = self._read_mesh_data(bo, local_space, mat, True, simplify)
+        return geometry
+
+    def _get_geometry_key(self, bo, shape, local_space, mat):
+        # Modifiers are applied to the collision geometry, so only objects without any enabled
+        # modifiers can share the geometry of their mesh datablock.
+        if bo.data is None or any(i.show_render for i in bo.modifiers):
+            data_key = ("object", bo.as_pointer())
+        else:
+            data_key = ("mesh", bo.data.as_pointer())
+
+        # Physicals can't have scale, so local space geometry is baked with the object's scale,
+        # but world space geometry is baked with the entire transform.
+        if local_space:
+            xform_key = tuple(mat.to_scale())
+        else:
+            xform_key = tuple(itertools.chain.from_iterable(mat))
+        return (data_key, shape, local_space, xform_key)
+
+    def _read_mesh_data(self, bo, local_space, mat, indices, simplify=None):
         mesh = bo.to_mesh(bpy.context.scene, True, "RENDER", calc_tessface=False)
+        num_source_tris = sum(len(i.vertices) - 2 for i in mesh.polygons)
+
+        # Blender's quadric decimation is only available as a modifier. The user's object must
+        # not be touched, so the evaluated mesh is decimated by a throwaway object instead.
+        if simplify is not None and 0 < simplify.simplify_target < num_source_tris:
+            with TemporaryObject(mesh, bpy.data.meshes.remove), \
+                 TemporaryObject(bpy.data.objects.new("KORMAN_COLLISION_DECIMATE", mesh), bpy.data.objects.remove) as temp_obj:
+                decimate = temp_obj.modifiers.new("KORMAN_COLLISION_DECIMATE", "DECIMATE")
+                decimate.decimate_type = "COLLAPSE"
+                decimate.ratio = simplify.simplify_target / num_source_tris
+                decimate.use_collapse_triangulate = True
+                mesh = temp_obj.to_mesh(bpy.context.scene, True, "RENDER", calc_tessface=False)
+
         with TemporaryObject(mesh, bpy.data.meshes.remove):
             if local_space:
-                mesh.update(calc_tessface=indices)
-                physical.pos = hsVector3(*mat.to_translation())
-                physical.rot = utils.quaternion(mat.to_quaternion())
-
                 # Physicals can't have scale...
                 scale = mat.to_scale()
-                if scale[0] == 1.0 and scale[1] == 1.0 and scale[2] == 1.0:
-                    # Whew, don't need to do any math!
-                    vertices = [hsVector3(*i.co) for i in mesh.vertices]
-                else:
+                if scale[0] != 1.0 or scale[1] != 1.0 or scale[2] != 1.0:
                     # Dagnabbit...
-                    vertices = [hsVector3(i.co.x * scale.x, i.co.y * scale.y, i.co.z * scale.z) for i in mesh.vertices]
+                    mesh.transform(mathutils.Matrix(((scale.x, 0.0, 0.0, 0.0),
+                                                     (0.0, scale.y, 0.0, 0.0),
+                                                     (0.0, 0.0, scale.z, 0.0),
+                                                     (0.0, 0.0, 0.0, 1.0))))
             else:
                 # apply the transform to the physical itself
                 utils.transform_mesh(mesh, mat)
-                mesh.update(calc_tessface=indices)
-                vertices = [hsVector3(*i.co) for i in mesh.vertices]
+            if simplify is not None:
+                self._simplify_mesh(mesh, simplify)
+            mesh.update(calc_tessface=indices)
+            vertices = self._convert_vertices(mesh)
 
             if indices:
-                return (vertices, self._convert_indices(mesh))
+                return (vertices, self._convert_indices(mesh), num_source_tris)
             else:
-                return vertices
+                return (vertices, None, num_source_tris)
+
+    def _simplify_mesh(self, mesh, simplify):
+        """Welds vertices and merges coplanar faces in an already transformed mesh"""
+        bm = bmesh.new()
+        try:
+            bm.from_mesh(mesh)
+            if simplify.simplify_weld > 0.0:
+                bmesh.ops.remove_doubles(bm, verts=bm.verts, dist=simplify.simplify_weld)
+            if simplify.simplify_angle > 0.0:
+                bmesh.ops.dissolve_limit(bm, angle_limit=simplify.simplify_angle,
+                                         verts=bm.verts, edges=bm.edges)
+                # Dissolving leaves us with n-gons that the tessellator might fan badly, so
+                # triangulate them ourselves with Blender's beauty fill.
+                bmesh.ops.triangulate(bm, faces=bm.faces, quad_method=0, ngon_method=0)
+            bm.to_mesh(mesh)
+        finally:
+            bm.free()
 
     def generate_flat_proxy(self, bo, so, **kwargs):
         """Generates a flat physical object"""
@@ -107,15 +200,12 @@ class PhysicsConverter:
 
                 if z_coord is None:
                     # Ensure all vertices are coplanar
-                    z_coords = [i.co.z for i in mesh.vertices]
+                    z_coords = self._read_coords(mesh)[2::3]
                     delta = max(z_coords) - min(z_coords)
                     if delta > 0.0002:
                         raise ExportAssertionError()
-                    vertices = [hsVector3(*i.co) for i in mesh.vertices]
-                else:
-                    # Flatten out all points to the given Z-coordinate
-                    vertices = [hsVector3(i.co.x, i.co.y, z_coord) for i in mesh.vertices]
-                physical.verts = vertices
+                # Flatten out all points to the given Z-coordinate, if any
+                physical.verts = self._convert_vertices(mesh, z_coord)
                 physical.indices = self._convert_indices(mesh)
                 physical.boundsType = plSimDefs.kProxyBounds
 
@@ -254,10 +344,11 @@ class PhysicsConverter:
                     local_space, mat = False, bo.matrix_world
             else:
                 raise NotImplementedError("ODE physical transform")
-            self._bounds_converters[bounds](bo, physical, local_space, mat)
+            extra_hulls = self._bounds_converters[bounds](bo, physical, local_space, mat)
         else:
             simIface = so.sim.object
             physical = simIface.physical.object
+            extra_hulls = None
 
             member_group = getattr(plSimDefs, kwargs.get("member_group", "kGroupLOSOnly"))
             if physical.memberGroup != member_group and member_group != plSimDefs.kGroupLOSOnly:
@@ -276,6 +367,38 @@ class PhysicsConverter:
                 raise ExportError(msg)
 
         self._apply_props(simIface, physical, kwargs)
+        if extra_hulls:
+            self._export_extra_hulls(bo, so, physical, extra_hulls, kwargs)
+
+    def _export_extra_hulls(self, bo, so, physical, hulls, props):
+        """Exports the remaining pieces of a convex decomposition as static physicals that
+           mirror the settings of the physical holding the first piece."""
+        mod = bo.plasma_modifiers.collision
+        for i, verts in enumerate(hulls, start=1):
+            name = f"{bo.name}_ConvexHull{i}"
+            hull_so = self._mgr.add_object(pl=plSceneObject, name=name, so=so)
+            hull_simIface = self._mgr.add_object(pl=plSimulationInterface, name=name, so=hull_so)
+            hull_physical = self._mgr.add_object(pl=plGenericPhysical, name=name, so=hull_so)
+
+            hull_simIface.physical = hull_physical.key
+            hull_physical.object = hull_so.key
+            hull_physical.sceneNode = physical.sceneNode
+            hull_physical.subWorld = physical.subWorld
+            hull_physical.pos = physical.pos
+            hull_physical.rot = physical.rot
+            hull_physical.memberGroup = physical.memberGroup
+            hull_physical.collideGroup = physical.collideGroup
+            hull_physical.reportGroup = physical.reportGroup
+            hull_physical.LOSDBs = physical.LOSDBs
+            hull_physical.friction = physical.friction
+            hull_physical.restitution = physical.restitution
+            hull_physical.soundGroup = physical.soundGroup
+            if mod.camera_blocker:
+                _set_phys_prop(plSimulationInterface.kCameraAvoidObject, hull_simIface, hull_physical)
+
+            hull_physical.boundsType = plSimDefs.kHullBounds
+            hull_physical.verts = verts
+            self._apply_props(hull_simIface, hull_physical, props)
 
     def _export_box(self, bo, physical, local_space, mat):
         """Exports box bounds based on the object"""
@@ -288,23 +411,80 @@ class PhysicsConverter:
         """Exports convex hull bounds based on the object"""
         physical.boundsType = plSimDefs.kHullBounds
 
+        key = self._get_geometry_key(bo, "hull", local_space, mat)
+        hull = self._geometry_cache.get(key)
+        if hull is None:
+            hull = self._geometry_cache[key] = self._calc_hull(bo, local_space, mat)
+        volume, verts = hull
+
+        # Don't export flat planes as convex hulls - force them to triangle meshes.
+        if verts is None:
+            self._report.warn(
+                "{}: Physical wants to be a convex hull but appears to be flat (volume={}), forcing to triangle mesh...",
+                bo.name, volume
+            )
+            self._export_trimesh(bo, physical, local_space, mat)
+            return
+
+        if local_space:
+            physical.pos = hsVector3(*mat.to_translation())
+            physical.rot = utils.quaternion(mat.to_quaternion())
+
+        # Concave objects may be split into several convex pieces. The additional pieces are
+        # separate static physicals, so this can't be done for anything that moves.
+        mod = bo.plasma_modifiers.collision
+        if mod.enabled and mod.decompose and not mod.dynamic and self._can_decompose(bo):
+            key = self._get_geometry_key(bo, "decomposed", local_space, mat)
+            key += (mod.decompose_max_hulls, mod.decompose_concavity)
+            hulls = self._geometry_cache.get(key)
+            if hulls is None:
+                hulls = self._geometry_cache[key] = self._decompose_hull(bo, local_space, mat,
+                                                                         mod.decompose_max_hulls,
+                                                                         mod.decompose_concavity)
+            if len(hulls) > 1:
+                self._report.msg("'{}': Decomposed into {} convex hulls", bo.name, len(hulls))
+                physical.verts = hulls[0]
+                return hulls[1:]
+        physical.verts = verts
+
+    def _can_decompose(self, bo):
+        # The extra pieces of a decomposed hull live on their own SceneObjects, so anything sent
+        # to (or asked about) the original object would never reach them. Subworld members are
+        # fine, the pieces are simply placed in the same subworld.
+        if utils.may_move(bo, self._exporter()):
+            reason = "it may be moved at runtime"
+        elif any((hasattr(mod, "logicwiz") for mod in bo.plasma_modifiers.modifiers)):
+            reason = "it has logic modifiers"
+        elif bo.name in self._get_node_targets():
+            reason = "it is referenced by a logic node tree"
+        else:
+            return True
+        self._report.warn("'{}': Collision will not be decomposed into convex pieces because {}.", bo.name, reason)
+        return False
+
+    def _get_node_targets(self):
+        """Gets the names of all objects referenced by the nodes of Plasma logic node trees"""
+        if self._node_targets is None:
+            self._node_targets = set()
+            for tree in (i for i in bpy.data.node_groups if i.bl_idname == "PlasmaNodeTree"):
+                for node in tree.nodes:
+                    for prop in node.bl_rna.properties:
+                        if prop.type == "POINTER":
+                            value = getattr(node, prop.identifier, None)
+                            if isinstance(value, bpy.types.Object):
+                                self._node_targets.add(value.name)
+        return self._node_targets
+
+    def _calc_hull(self, bo, local_space, mat):
         # Only certain builds of libHSPlasma are able to take artist generated triangle soups and
         # bake them to convex hulls. Specifically, Windows 32-bit w/PhysX 2.6. Everything else just
         # needs to have us provide some friendlier data...
         with bmesh_from_object(bo) as mesh:
-            # Don't export flat planes as convex hulls - force them to triangle meshes.
             volume = mesh.calc_volume()
             if volume < 0.001:
-                self._report.warn(
-                    "{}: Physical wants to be a convex hull but appears to be flat (volume={}), forcing to triangle mesh...",
-                    bo.name, volume
-                )
-                self._export_trimesh(bo, physical, local_space, mat)
-                return
+                return (volume, None)
 
             if local_space:
-                physical.pos = hsVector3(*mat.to_translation())
-                physical.rot = utils.quaternion(mat.to_quaternion())
                 bmesh.ops.scale(mesh, vec=mat.to_scale(), verts=mesh.verts)
             else:
                 mesh.transform(mat)
@@ -312,7 +492,120 @@ class PhysicsConverter:
             result = bmesh.ops.convex_hull(mesh, input=mesh.verts, use_existing_faces=False)
             BMVert = bmesh.types.BMVert
             verts = itertools.takewhile(lambda x: isinstance(x, BMVert), result["geom"])
-            physical.verts = [hsVector3(*i.co) for i in verts]
+            return (volume, [hsVector3(*i.co) for i in verts])
+
+    def _decompose_hull(self, bo, local_space, mat, max_hulls, concavity):
+        """Approximately decomposes an object into convex pieces by repeatedly cutting the most
+           concave piece in half along whichever axis best reduces the total hull volume."""
+        BMEdge, BMFace, BMVert = bmesh.types.BMEdge, bmesh.types.BMFace, bmesh.types.BMVert
+
+        def calc_piece_hull(piece):
+            hull = piece.copy()
+            try:
+                result = bmesh.ops.convex_hull(hull, input=hull.verts, use_existing_faces=False)
+                geom = result["geom"]
+                verts = [i.co.copy() for i in geom if isinstance(i, BMVert)]
+                # Sum the signed volumes of tetrahedra fanned out from the origin.
+                volume = 0.0
+                for face in (i for i in geom if isinstance(i, BMFace)):
+                    coords = [i.co for i in face.verts]
+                    for j in range(1, len(coords) - 1):
+                        volume += coords[0].dot(coords[j].cross(coords[j+1])) / 6.0
+                return abs(volume), verts
+            finally:
+                hull.free()
+
+        def make_piece(piece):
+            hull_volume, hull_verts = calc_piece_hull(piece)
+            empty_volume = max(hull_volume - piece.calc_volume(), 0.0)
+            return [empty_volume, hull_volume, hull_verts, piece]
+
+        def cut_piece(piece, co, no, keep_positive):
+            cut = piece.copy()
+            geom = cut.verts[:] + cut.edges[:] + cut.faces[:]
+            result = bmesh.ops.bisect_plane(cut, geom=geom, dist=0.0001, plane_co=co, plane_no=no,
+                                            clear_inner=keep_positive, clear_outer=not keep_positive)
+            cut_edges = [i for i in result["geom_cut"] if isinstance(i, BMEdge)]
+            bmesh.ops.holes_fill(cut, edges=cut_edges, sides=0)
+            if not cut.faces:
+                cut.free()
+                return None
+            return cut
+
+        def split_piece(piece):
+            """Splits a piece at the center of its bounding box. Returns the best pair of pieces."""
+            coords = [i.co for i in piece.verts]
+            bounds_min = mathutils.Vector(map(min, zip(*coords)))
+            bounds_max = mathutils.Vector(map(max, zip(*coords)))
+            center = (bounds_min + bounds_max) * 0.5
+
+            best = None
+            try:
+                for axis in range(3):
+                    if bounds_max[axis] - bounds_min[axis] < 0.001:
+                        continue
+                    no = mathutils.Vector((0.0, 0.0, 0.0))
+                    no[axis] = 1.0
+                    halves = [cut_piece(piece, center, no, i) for i in (True, False)]
+                    if None in halves:
+                        for i in (i for i in halves if i is not None):
+                            i.free()
+                        continue
+
+                    try:
+                        halves = [make_piece(i) for i in halves]
+                    except:
+                        for i in halves:
+                            i.free()
+                        raise
+                    total_volume = sum(i[1] for i in halves)
+                    if best is None or total_volume < best[0]:
+                        if best is not None:
+                            for i in best[1]:
+                                i[3].free()
+                        best = (total_volume, halves)
+                    else:
+                        for i in halves:
+                            i[3].free()
+            except:
+                if best is not None:
+                    for i in best[1]:
+                        i[3].free()
+                raise
+            return best[1] if best is not None else None
+
+        pieces = []
+        try:
+            with bmesh_from_object(bo) as mesh:
+                # bmesh_from_object frees its mesh, so hang onto a copy of our own.
+                whole = mesh.copy()
+            try:
+                if local_space:
+                    bmesh.ops.scale(whole, vec=mat.to_scale(), verts=whole.verts)
+                else:
+                    whole.transform(mat)
+                pieces.append(make_piece(whole))
+            except:
+                whole.free()
+                raise
+
+            while len(pieces) < max_hulls:
+                piece = max(pieces, key=lambda x: x[0])
+                if piece[0] <= piece[1] * concavity:
+                    break
+                halves = split_piece(piece[3])
+                if halves is None:
+                    # Can't be split any further, so pretend it is perfectly convex.
+                    piece[0] = 0.0
+                else:
+                    pieces.remove(piece)
+                    piece[3].free()
+                    pieces.extend(halves)
+
+            return [[hsVector3(*i) for i in piece[2]] for piece in pieces if piece[2]]
+        finally:
+            for piece in pieces:
+                piece[3].free()
 
     def _export_sphere(self, bo, physical, local_space, mat):
         """Exports sphere bounds based on the object"""
@@ -326,12 +619,21 @@ class PhysicsConverter:
 
         # Triangle meshes MAY optionally specify a proxy object to fetch the triangles from...
         mod = bo.plasma_modifiers.collision
+        # Simplification is only offered for triangle mesh bounds, not for convex hulls that
+        # could not be built and fell back to a triangle mesh.
+        simplify = mod if mod.enabled and mod.bounds == "trimesh" and mod.simplify else None
         if mod.enabled and mod.proxy_object is not None:
             physical.boundsType = plSimDefs.kProxyBounds
-            vertices, indices = self._convert_mesh_data(mod.proxy_object, physical, local_space, mat)
+            vertices, indices, num_source_tris = self._convert_trimesh_data(mod.proxy_object, physical,
+                                                                            local_space, mat, simplify)
         else:
             physical.boundsType = plSimDefs.kExplicitBounds
-            vertices, indices = self._convert_mesh_data(bo, physical, local_space, mat)
+            vertices, indices, num_source_tris = self._convert_trimesh_data(bo, physical,
+                                                                            local_space, mat, simplify)
+
+        if simplify is not None:
+            self._report.msg("'{}': Simplified collision from {} to {} triangles", bo.name,
+                             num_source_tris, len(indices) // 3)
 
         physical.verts = vertices
         physical.indices = indices
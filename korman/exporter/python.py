@@ -14,14 +14,92 @@
 #    along with Korman.  If not, see <http://www.gnu.org/licenses/>.
 
 import bpy
+from hashlib import md5
+import os
 from pathlib import Path
 from PyHSPlasma import *
 
 from .explosions import ExportError
 from . import logger
+from . import utils
 from .. import korlib
 from ..plasma_magic import plasma_python_glue, very_very_special_python
 
+_MAX_BYTECODE_CACHE_ENTRIES = 2048
+
+def _get_bytecode_cache_path():
+    return Path(bpy.utils.user_resource("DATAFILES", os.path.join("korman", "pycache"), True))
+
+def _prune_bytecode_cache(cache_path):
+    """Removes the least recently used entries from the bytecode cache once it is over budget"""
+    try:
+        entries = []
+        for i in cache_path.glob("*.bin"):
+            entries.append((i.stat().st_mtime, i))
+    except OSError:
+        return
+    entries.sort(key=lambda x: x[0])
+    for mtime, cache_file in entries[:max(len(entries) - _MAX_BYTECODE_CACHE_ENTRIES, 0)]:
+        try:
+            cache_file.unlink()
+        except OSError:
+            pass
+
+def compyle_cached(py_files, py_version, report=None):
+    """Like korlib.compyle_many, but bytecode is reused from an on-disk cache for scripts that
+       were already compyled for the same Python version in a previous export."""
+    try:
+        cache_path = _get_bytecode_cache_path()
+    except OSError:
+        cache_path = None
+
+    def make_cache_file(filename, py_code):
+        hasher = md5()
+        hasher.update("{}.{}\0{}\0".format(*py_version, filename).encode("utf-8"))
+        hasher.update(py_code.encode("utf-8", "surrogatepass"))
+        return cache_path.joinpath("{}.bin".format(hasher.hexdigest()))
+
+    results, misses = [None] * len(py_files), []
+    for i, (filename, py_code) in enumerate(py_files):
+        if cache_path is not None:
+            cache_file = make_cache_file(filename, py_code)
+            try:
+                results[i] = (True, cache_file.read_bytes())
+            except OSError:
+                pass
+            else:
+                # Bump the modify time so that this entry survives pruning.
+                try:
+                    os.utime(str(cache_file))
+                except OSError:
+                    pass
+                if report is not None:
+                    report.msg("Using cached bytecode for {}", filename)
+                    report.event("cache", cache="bytecode", name=filename, hit=True)
+                continue
+        if report is not None:
+            report.event("cache", cache="bytecode", name=filename, hit=False)
+        misses.append(i)
+
+    compyled = korlib.compyle_many([py_files[i] for i in misses], py_version, report)
+    for i, result in zip(misses, compyled):
+        results[i] = result
+        success, pyc = result
+        if success and cache_path is not None:
+            # Write to a temporary file first so that an interrupted export can't leave
+            # behind a truncated entry that would be happily loaded next time.
+            cache_file = make_cache_file(*py_files[i])
+            temp_file = cache_file.with_suffix(".tmp")
+            try:
+                temp_file.write_bytes(pyc)
+                os.replace(str(temp_file), str(cache_file))
+            except OSError:
+                if report is not None:
+                    report.warn("Failed to cache bytecode for {}", py_files[i][0])
+    if misses and cache_path is not None:
+        _prune_bytecode_cache(cache_path)
+    return results
+
 class PythonPackageExporter:
     def __init__(self, filepath, version):
         self._filepath = filepath
@@ -40,7 +118,7 @@ class PythonPackageExporter:
             py_version = (2, 2)
         else:
             py_version = (2, 3)
-        py_code = []
+        py_files = []
 
         for filename, source in self._pfms.items():
             if isinstance(source, Text):
@@ -52,11 +130,7 @@ class PythonPackageExporter:
                 code = source
 
             code = "{}\n\n{}\n".format(code, plasma_python_glue)
-            success, result = korlib.compyle(filename, code, py_version, report)
-            if not success:
-                raise ExportError("Failed to compyle '{}':\n{}".format(filename, result))
-            py_code.append((filename, result))
-            inc_progress()
+            py_files.append((filename, code))
 
         for filename, source in self._modules.items():
             if isinstance(source, Text):
@@ -68,7 +142,12 @@ class PythonPackageExporter:
                 code = source
 
             # no glue needed here, ma!
-            success, result = korlib.compyle(filename, code, py_version, report)
+            py_files.append((filename, code))
+
+        # Unchanged scripts come from the bytecode cache, everything else is spread over
+        # several Python interpreters at once.
+        py_code = []
+        for (filename, _), (success, result) in zip(py_files, compyle_cached(py_files, py_version, report)):
             if not success:
                 raise ExportError("Failed to compyle '{}':\n{}".format(filename, result))
             py_code.append((filename, result))
@@ -132,7 +211,7 @@ class PythonPackageExporter:
         """Runs a stripped-down version of the Exporter that only handles Python files"""
         age_props = bpy.context.scene.world.plasma_age
         log = logger.ExportVerboseLogger if age_props.verbose else logger.ExportProgressLogger
-        with korlib.ConsoleToggler(age_props.show_console), log(self._filepath) as report:
+        with korlib.ConsoleToggler(age_props.show_console), log(self._filepath, age_props.log_level, age_props.event_log, age_props.live_progress) as report:
             report.progress_add_step("Harvesting Plasma PythonFileMods")
             report.progress_add_step("Harvesting Helper Python Modules")
             report.progress_add_step("Compyling Python Code")
@@ -157,6 +236,25 @@ class PythonPackageExporter:
             report.error("No Python files were packaged.")
         self._write_python_pak(py_code, report)
 
+    def _is_python_pak_current(self, py_code, enc):
+        if not Path(self._filepath).is_file():
+            return False
+        try:
+            # A pak with the right code but the wrong encryption (eg from exporting for
+            # another game) is not current.
+            if utils.file_encryption(self._filepath) != enc:
+                return False
+            if enc is None:
+                with hsFileStream(self._version).open(self._filepath, fmRead) as stream:
+                    existing_code = korlib.read_python_pak(stream)
+            else:
+                with plEncryptedStream(self._version).open(self._filepath, fmRead, plEncryptedStream.kEncAuto) as stream:
+                    existing_code = korlib.read_python_pak(stream)
+        except Exception:
+            # Whatever is there is not something we can read, so it will just get overwritten.
+            return False
+        return existing_code == py_code
+
     def _write_python_pak(self, py_code, report):
         report.progress_advance()
 
@@ -167,6 +265,11 @@ class PythonPackageExporter:
         else:
             enc = plEncryptedStream.kEncXtea
 
+        # Rewriting (and re-encrypting) an identical pak is a waste of time.
+        if self._is_python_pak_current(py_code, enc):
+            report.msg("'{}' is already up to date", Path(self._filepath).name)
+            return
+
         if enc is None:
             stream = hsFileStream(self._version).open(self._filepath, fmCreate)
         else:
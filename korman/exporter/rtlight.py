@@ -14,7 +14,10 @@
 #    along with Korman.  If not, see <http://www.gnu.org/licenses/>.
 
 import bpy
+import math
+import mathutils
 from PyHSPlasma import *
+from typing import *
 import weakref
 
 from .explosions import *
@@ -36,9 +39,192 @@ SHADOW_RESOLUTION = {
     "HIGH": 512,
 }
 
+def attenuation_end(lamp) -> float:
+    """Calculates the distance at which Plasma will cut off this lamp's attenuation"""
+    return lamp.distance if lamp.use_sphere else lamp.distance * 2
+
+def layer_mask(layers) -> int:
+    """Converts a Blender layer boolean sequence into a bitmask"""
+    mask = 0
+    for i, value in enumerate(layers):
+        if value:
+            mask |= 1 << i
+    return mask
+
+
+def calc_influence_bounds(bo, exporter=None) -> Optional[Tuple[Tuple[float, ...], Tuple[float, ...]]]:
+    """Calculates the world space axis aligned bounding box of the volume a lamp can affect.
+       Returns None if the lamp affects everything, or may move away from where it is now."""
+    lamp = bo.data
+    if lamp.type not in {"POINT", "SPOT"}:
+        return None
+    if bo.plasma_object.has_animation_data or utils.may_move(bo, exporter):
+        return None
+
+    matrix = bo.matrix_world
+    apex = matrix.to_translation()
+    radius = attenuation_end(lamp)
+    half_angle = lamp.spot_size / 2.0 if lamp.type == "SPOT" else math.pi
+    if half_angle >= math.pi / 2.0:
+        return (tuple((apex[i] - radius for i in range(3))),
+                tuple((apex[i] + radius for i in range(3))))
+
+    # Spot lamps shine down their local -Z axis. The cone is bounded by its apex, the circle
+    # where the cone meets the attenuation sphere, and any extreme point of that sphere which
+    # falls inside of the cone.
+    direction = (matrix.to_3x3() * mathutils.Vector((0.0, 0.0, -1.0))).normalized()
+    rim_center = apex + direction * (radius * math.cos(half_angle))
+    rim_radius = radius * math.sin(half_angle)
+    lo, hi = list(apex), list(apex)
+    for i in range(3):
+        rim_extent = rim_radius * math.sqrt(max(0.0, 1.0 - direction[i] ** 2))
+        lo[i] = min(lo[i], rim_center[i] - rim_extent)
+        hi[i] = max(hi[i], rim_center[i] + rim_extent)
+        if math.acos(max(-1.0, min(1.0, direction[i]))) <= half_angle:
+            hi[i] = apex[i] + radius
+        if math.acos(max(-1.0, min(1.0, -direction[i]))) <= half_angle:
+            lo[i] = apex[i] - radius
+    return (tuple(lo), tuple(hi))
+
+def calc_world_bounds(bo) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    """Calculates the world space axis aligned bounding box of an object"""
+    matrix = bo.matrix_world
+    corners = [matrix * mathutils.Vector(i) for i in bo.bound_box]
+    return (tuple((min((j[i] for j in corners)) for i in range(3))),
+            tuple((max((j[i] for j in corners)) for i in range(3))))
+
+def _bounds_intersect(a, b) -> bool:
+    return all((a[0][i] <= b[1][i] and b[0][i] <= a[1][i] for i in range(3)))
+
+
+class _IndexedLamp:
+    __slots__ = ("bo", "layers", "animated", "plasma", "own_layer", "projection", "bounds")
+
+    def __init__(self, bo, exporter=None):
+        lamp = bo.data
+        self.bo = bo
+        self.layers = layer_mask(bo.layers)
+        self.animated = bo.plasma_object.has_animation_data
+        self.plasma = bo.plasma_object.enabled
+        self.own_layer = lamp.use_own_layer
+        self.projection = any((i is not None and i.texture is not None for i in lamp.texture_slots))
+        self.bounds = calc_influence_bounds(bo, exporter)
+
+
+class _LampBVH:
+    """Bounding volume hierarchy over the influence volumes of lamps"""
+
+    _LEAF_SIZE = 4
+
+    def __init__(self, lamps: Iterable[_IndexedLamp]):
+        self._unbounded = []
+        bounded = []
+        for lamp in lamps:
+            if lamp.bounds is None:
+                self._unbounded.append(lamp)
+            else:
+                bounded.append(lamp)
+        self._root = self._build(bounded) if bounded else None
+
+    def _build(self, lamps):
+        lo = tuple((min((i.bounds[0][axis] for i in lamps)) for axis in range(3)))
+        hi = tuple((max((i.bounds[1][axis] for i in lamps)) for axis in range(3)))
+        if len(lamps) <= self._LEAF_SIZE:
+            return ((lo, hi), tuple(lamps), None, None)
+
+        # Split on the median of the lamp centers along the longest axis
+        axis = max(range(3), key=lambda x: hi[x] - lo[x])
+        lamps.sort(key=lambda x: x.bounds[0][axis] + x.bounds[1][axis])
+        mid = len(lamps) // 2
+        return ((lo, hi), None, self._build(lamps[:mid]), self._build(lamps[mid:]))
+
+    def query(self, bounds) -> Iterator[_IndexedLamp]:
+        """Yields all lamps whose influence volume intersects the given bounding box"""
+        yield from self._unbounded
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node_bounds, lamps, left, right = stack.pop()
+            if not _bounds_intersect(node_bounds, bounds):
+                continue
+            if lamps is not None:
+                yield from (i for i in lamps if _bounds_intersect(i.bounds, bounds))
+            else:
+                stack.append(left)
+                stack.append(right)
+
+
+class LampIndex:
+    """Index of all lamps in the scene, built once per export on first use"""
+
+    def __init__(self, exporter=None):
+        self._exporter = weakref.ref(exporter) if exporter is not None else None
+        self._lamps: Optional[Dict[str, _IndexedLamp]] = None
+        self._bakeable: Dict[bool, Tuple[bpy.types.Object, ...]] = {}
+        self._light_groups: Dict[str, Tuple[_IndexedLamp, ...]] = {}
+        self._bvh: Optional[_LampBVH] = None
+
+    def _build(self):
+        self._lamps = {}
+        exporter = self._exporter() if self._exporter is not None else None
+        for bo in bpy.context.scene.objects:
+            if bo.type == "LAMP":
+                self._lamps[bo.name] = _IndexedLamp(bo, exporter)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.lamps
+
+    def __getitem__(self, name: str) -> _IndexedLamp:
+        return self.lamps[name]
+
+    def get(self, name: str) -> Optional[_IndexedLamp]:
+        return self.lamps.get(name)
+
+    def bakeable_lamps(self, include_plasma: bool) -> Tuple[bpy.types.Object, ...]:
+        """Returns all unanimated lamps, optionally including those that are Plasma Objects"""
+        result = self._bakeable.get(include_plasma)
+        if result is None:
+            result = tuple((i.bo for i in self.lamps.values()
+                            if not i.animated and (include_plasma or not i.plasma)))
+            self._bakeable[include_plasma] = result
+        return result
+
+    def is_bakeable(self, bo: bpy.types.Object, include_plasma: bool) -> bool:
+        """Tests if an object is unanimated and, optionally, not a Plasma Object"""
+        lamp = self.lamps.get(bo.name)
+        if lamp is not None:
+            animated, plasma = lamp.animated, lamp.plasma
+        else:
+            animated, plasma = bo.plasma_object.has_animation_data, bo.plasma_object.enabled
+        return not animated and (include_plasma or not plasma)
+
+    def light_group_lamps(self, light_group: bpy.types.Group) -> Tuple[_IndexedLamp, ...]:
+        """Returns all Plasma Object lamps in a given light group"""
+        result = self._light_groups.get(light_group.name)
+        if result is None:
+            lamps = self.lamps
+            result = tuple((lamps[i.name] for i in light_group.objects
+                            if i.name in lamps and lamps[i.name].plasma))
+            self._light_groups[light_group.name] = result
+        return result
+
+    def lamps_in_bounds(self, bounds) -> FrozenSet[str]:
+        """Returns the names of all lamps whose influence volume intersects the given bounding box"""
+        if self._bvh is None:
+            self._bvh = _LampBVH(self.lamps.values())
+        return frozenset((i.bo.name for i in self._bvh.query(bounds)))
+
+    @property
+    def lamps(self) -> Dict[str, _IndexedLamp]:
+        if self._lamps is None:
+            self._build()
+        return self._lamps
+
+
 class LightConverter:
     def __init__(self, exporter):
         self._exporter = weakref.ref(exporter)
+        self.lamp_index = LampIndex(exporter)
+        self._reachable_lamps = {}
         self._converter_funcs = {
             "AREA": self._convert_area_lamp,
             "POINT": self._convert_point_lamp,
@@ -72,7 +258,7 @@ class LightConverter:
 
     def convert_attenuation(self, lamp):
         intens = abs(lamp.energy)
-        attenEnd = lamp.distance if lamp.use_sphere else lamp.distance * 2
+        attenEnd = attenuation_end(lamp)
         return (intens, attenEnd)
 
     def convert_attenuation_linear(self, intensity, end):
@@ -262,36 +448,31 @@ class LightConverter:
             # If there is, we will harvest all Blender lamps in that light group that are Plasma Objects
             lg = bm.light_group
             if lg is not None:
-                for obj in lg.objects:
-                    if obj.type != "LAMP":
-                        # moronic...
-                        continue
-                    elif not obj.plasma_object.enabled:
-                        # who cares?
-                        continue
+                bo_layers = layer_mask(bo.layers)
+                lg_lamps = self.lamp_index.light_group_lamps(lg)
+                reachable_lamps = self._find_reachable_lamps(bo) if lg_lamps else None
+                for indexed_lamp in lg_lamps:
+                    obj = indexed_lamp.bo
                     lamp = obj.data
 
                     # Check to see if they only want this light to work on its layer...
-                    if lamp.use_own_layer:
-                        # Pairs up elements from both layers sequences such that we can compare
-                        # to see if the lamp and object are in the same layer.
-                        # If you can think of a better way, be my guest.
-                        test = zip(bo.layers, obj.layers)
-                        for i in test:
-                            if i == (True, True):
-                                break
-                        else:
-                            # didn't find a layer where both lamp and object were, skip it.
-                            self._report.msg(f"[{lamp.type}] '{obj.name}': not in same layer, skipping...")
-                            continue
+                    if indexed_lamp.own_layer and not indexed_lamp.layers & bo_layers:
+                        # didn't find a layer where both lamp and object were, skip it.
+                        self._report.msg(f"[{lamp.type}] '{obj.name}': not in same layer, skipping...")
+                        continue
+
+                    # Lamps that cannot possibly reach this object are useless.
+                    if reachable_lamps is not None and obj.name not in reachable_lamps:
+                        self._report.msg(f"[{lamp.type}] '{obj.name}': out of range, skipping...")
+                        continue
 
                     # This is probably where PermaLight vs PermaProj should be sorted out...
                     pl_light = self.get_light_key(obj, lamp, None)
-                    if self._is_projection_lamp(lamp):
+                    if indexed_lamp.projection:
                         self._report.msg(f"[{lamp.type}] PermaProj '{obj.name}'")
                         permaProjs.append(pl_light)
                     else:
-                        self._report.msg(f"[{lamp.type}] PermaLight '{obj.name}'", lamp.type, obj.name)
+                        self._report.msg(f"[{lamp.type}] PermaLight '{obj.name}'")
                         permaLights.append(pl_light)
 
         if len(permaLights) > 8:
@@ -299,6 +480,17 @@ class LightConverter:
 
         return (permaLights, permaProjs)
 
+    def _find_reachable_lamps(self, bo) -> Optional[FrozenSet[str]]:
+        """Finds the names of all lamps whose influence volume intersects the object's bounds,
+           or None if the object may move away from where it is now."""
+        if self._exporter().has_coordiface(bo):
+            return None
+        result = self._reachable_lamps.get(bo.name)
+        if result is None:
+            result = self.lamp_index.lamps_in_bounds(calc_world_bounds(bo))
+            self._reachable_lamps[bo.name] = result
+        return result
+
     def get_light_key(self, bo, bl_light, so):
         try:
             xlate = _BL2PL[bl_light.type]
@@ -27,6 +27,21 @@ from PyHSPlasma import *
 
 from ..import helpers
 
+# Magic strings that plEncryptedStream writes at the start of encrypted files
+_ENCRYPTION_MAGIC = {
+    b"whatdoyousee": plEncryptedStream.kEncXtea,
+    b"BriceIsSmart": plEncryptedStream.kEncAes,
+}
+
+def file_encryption(path: str) -> Optional[int]:
+    """Returns the plEncryptedStream encryption type of a file, or None if it is not encrypted.
+       Encryption types we don't know about are reported as kEncAuto."""
+    if not plEncryptedStream.IsFileEncrypted(path):
+        return None
+    with open(path, "rb") as handle:
+        magic = handle.read(12)
+    return _ENCRYPTION_MAGIC.get(magic, plEncryptedStream.kEncAuto)
+
 def affine_parts(xform):
     # Decompose the matrix into the 90s-era 3ds max affine parts sillyness
     # All that's missing now is something like "(c) 1998 HeadSpin" oh wait...
@@ -62,6 +77,23 @@ def matrix44(blmat):
         hsmat[i, 3] = blmat[i][3]
     return hsmat
 
+def may_move(bo: bpy.types.Object, exporter=None) -> bool:
+    """Tests if an object may be moved at runtime, either by itself or by anything it is
+       parented to."""
+    # NOTE: exporter.has_coordiface() is always True for lamps and for anything with a parent
+    # or children, so we check the reasons a coordinate interface would actually move up the
+    # parent chain.
+    while bo is not None:
+        if bo.plasma_object.has_transform_animation:
+            return True
+        if exporter is not None:
+            if bo.name in exporter.actors:
+                return True
+            if any((mod.requires_actor for mod in bo.plasma_modifiers.modifiers)):
+                return True
+        bo = bo.parent
+    return False
+
 def quaternion(blquat):
     """Converts a mathutils.Quaternion to an hsQuat"""
     return hsQuat(blquat.x, blquat.y, blquat.z, blquat.w)
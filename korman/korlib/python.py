@@ -20,47 +20,167 @@ import sys
 
 _python_executables = {}
 
+# Long-lived Python 2.x interpreters, by Python version, that are not currently compyling
+_idle_compylers = {}
+_compylers_registered = 0
+_MAX_COMPYLERS = 4
+
 class PythonNotAvailableError(Exception):
     pass
 
 
+class _Compyler:
+    """A Python 2.x interpreter that compyles the modules streamed to it over its stdin.
+       Each request is a header line of "<name length> <code length>" followed by the module
+       name and source code. Each response is a header line of "<status> <length>" followed by
+       either the marshalled code object or the traceback of the failure."""
+
+    def __init__(self, py_executable):
+        import subprocess, tempfile
+        args = (py_executable, __file__, "--serve")
+        # Anything the interpreter complains about goes to a file rather than a pipe so that
+        # it can't block the interpreter while we're waiting on its output.
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                         stderr=self._stderr)
+
+    def close(self):
+        import subprocess
+        try:
+            self._process.stdin.close()
+            self._process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self._process.kill()
+        self._stderr.close()
+
+    def read_errors(self):
+        """Gets everything the interpreter has written to stderr so far"""
+        try:
+            self._stderr.seek(0)
+            return self._stderr.read()
+        except (OSError, ValueError):
+            return b""
+
+    def compyle(self, module_name, py_code):
+        module_name = module_name.encode("utf-8")
+        header = "{} {}\n".format(len(module_name), len(py_code)).encode("ascii")
+        stdin, stdout = self._process.stdin, self._process.stdout
+        stdin.write(header)
+        stdin.write(module_name)
+        stdin.write(py_code)
+        stdin.flush()
+
+        header = stdout.readline().split()
+        if len(header) != 2:
+            raise EOFError("The Python compyler exited unexpectedly")
+        result = stdout.read(int(header[1]))
+        return (int(header[0]) == 0, result)
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+
+def _acquire_compyler(py_version, py_executable):
+    global _compylers_registered
+    idle = _idle_compylers.setdefault(py_version, [])
+    try:
+        return idle.pop()
+    except IndexError:
+        if not _compylers_registered:
+            import atexit
+            atexit.register(shutdown_compylers)
+            _compylers_registered = 1
+        return _Compyler(py_executable)
+
+def _release_compyler(py_version, compyler):
+    if compyler.is_alive():
+        _idle_compylers[py_version].append(compyler)
+    else:
+        compyler.close()
+
 def compyle(file_name, py_code, py_version, report=None):
+    return compyle_many(((file_name, py_code),), py_version, report)[0]
+
+def compyle_many(files, py_version, report=None):
+    """Compyles a sequence of (file name, source code) pairs for the given Python version,
+       spreading them over several Python interpreters. Returns a list of (success, result)
+       pairs in the same order as the given files."""
     # NOTE: Should never run under Python 2.x
     my_version = sys.version_info[:2]
     assert my_version == (2, 7) or my_version[0] > 2
 
-    # Remember: Python 2.2 file, so no single line if statements...
-    idx = file_name.find('.')
-    if idx == -1:
-        module_name = file_name
-    else:
-        module_name = file_name[:idx]
-
-    if report is not None:
-        report.msg("Compyling {}", file_name)
-
-    if my_version != py_version:
-        import subprocess
+    if my_version == py_version:
+        raise NotImplementedError()
 
-        py_executable = _find_python(py_version)
-        args = (py_executable, __file__, module_name)
+    jobs = []
+    for file_name, py_code in files:
+        # Remember: Python 2.2 file, so no single line if statements...
+        idx = file_name.find('.')
+        if idx == -1:
+            module_name = file_name
+        else:
+            module_name = file_name[:idx]
         try:
             py_code = py_code.encode("utf-8")
         except UnicodeError:
-            if report is not None:
-                report.error("Could not encode '{}'", file_name, indent=report.indent_level+1)
+            py_code = None
+        jobs.append((file_name, module_name, py_code))
+        if report is not None:
+            report.msg("Compyling {}", file_name)
+    if not jobs:
+        return []
+
+    # Be sure we can actually find Python before spinning anything up. This must happen here
+    # and not in the worker threads because it may need to poke around in Blender.
+    py_executable = _find_python(py_version)
+
+    def run_job(job):
+        file_name, module_name, py_code = job
+        if py_code is None:
             return (False, "Could not encode file")
-        result = subprocess.run(args, input=py_code, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        if result.returncode != 0:
-            try:
-                error = result.stdout.decode("utf-8").replace('\r\n', '\n')
-            except UnicodeError:
-                error = result.stdout
-            if report is not None:
-                report.error("Compylation Error in '{}'\n{}", file_name, error, indent=report.indent_level+1)
-        return (result.returncode == 0, result.stdout)
+        compyler = _acquire_compyler(py_version, py_executable)
+        try:
+            result = compyler.compyle(module_name, py_code)
+        except (OSError, EOFError, ValueError):
+            errors = compyler.read_errors()
+            compyler.close()
+            return (False, b"The Python compyler exited unexpectedly\n" + errors)
+        _release_compyler(py_version, compyler)
+        return result
+
+    num_compylers = min(len(jobs), _MAX_COMPYLERS)
+    if num_compylers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(num_compylers)
+        try:
+            results = list(executor.map(run_job, jobs))
+        finally:
+            executor.shutdown()
     else:
-        raise NotImplementedError()
+        results = [run_job(i) for i in jobs]
+
+    if report is not None:
+        for job, result in zip(jobs, results):
+            file_name, module_name, py_code = job
+            success, error = result
+            if success:
+                continue
+            if py_code is None:
+                report.error("Could not encode '{}'", file_name, indent=report.indent_level+1)
+            else:
+                try:
+                    error = error.decode("utf-8").replace('\r\n', '\n')
+                except UnicodeError:
+                    pass
+                report.error("Compylation Error in '{}'\n{}", file_name, error, indent=report.indent_level+1)
+    return results
+
+def shutdown_compylers():
+    """Stops all of the Python interpreters kept around for compyling"""
+    for compylers in _idle_compylers.values():
+        for i in compylers:
+            i.close()
+        del compylers[:]
 
 def _compyle(module_name, py_code):
     # Old python versions have major issues with Windows style newlines.
@@ -108,7 +228,9 @@ def _find_python(py_version):
         # I give up, you win.
         return None
 
-    py_executable = _python_executables.setdefault(py_version, find_executable(py_version))
+    if py_version not in _python_executables:
+        _python_executables[py_version] = find_executable(py_version)
+    py_executable = _python_executables[py_version]
     if py_executable:
         return py_executable
     else:
@@ -165,6 +287,23 @@ def package_python(stream, pyc_objects):
         stream.writeInt(len(compyled_code))
         stream.write(compyled_code)
 
+def read_python_pak(stream):
+    """Reads the (module name, compyled code) pairs back out of a Python.pak stream"""
+    num_files = stream.readInt()
+    index = []
+    for i in range(num_files):
+        module_name = stream.readSafeStr()
+        index.append((module_name, stream.readInt()))
+
+    pyc_objects = []
+    for module_name, offset in index:
+        # Avoid seeking unless really needed (see package_python).
+        if stream.pos != offset:
+            stream.seek(offset)
+        size = stream.readInt()
+        pyc_objects.append((module_name, stream.read(size)))
+    return pyc_objects
+
 def verify_python(py_version, py_exe):
     if not py_exe:
         return False
@@ -186,17 +325,42 @@ def verify_python(py_version, py_exe):
             return False
         return "{}.{}".format(*py_version) == py_check
 
+def _serve():
+    # Python 2.2 file, so no with statements or conditional expressions down here.
+    import traceback
+    stdin, stdout = sys.stdin, sys.stdout
+    while 1:
+        header = stdin.readline()
+        if not header:
+            break
+        name_len, code_len = map(int, header.split())
+        module_name = stdin.read(name_len)
+        py_code = stdin.read(code_len)
+        try:
+            result = _compyle(module_name, py_code)
+            status = 0
+        except:
+            result = "".join(traceback.format_exception(*sys.exc_info()))
+            status = 1
+        stdout.write("%d %d\n" % (status, len(result)))
+        stdout.write(result)
+        stdout.flush()
+
 if __name__ == "__main__":
     # Python tries to be "helpful" on Windows by converting \n to \r\n.
-    # Therefore we must change the mode of stdout.
+    # Therefore we must change the mode of stdout. And stdin, because we count bytes.
     if sys.platform == "win32":
         import os, msvcrt
+        msvcrt.setmode(sys.stdin.fileno(), os.O_BINARY)
         msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
 
     try:
         module_name = sys.argv[1]
     except IndexError:
         module_name = "<string>"
-    py_code_source = sys.stdin.read()
-    py_code_object = _compyle(module_name, py_code_source)
-    sys.stdout.write(py_code_object)
+    if module_name == "--serve":
+        _serve()
+    else:
+        py_code_source = sys.stdin.read()
+        py_code_object = _compyle(module_name, py_code_source)
+        sys.stdout.write(py_code_object)
@@ -16,10 +16,12 @@
 import bpy
 from bpy.props import *
 
-from collections.abc import Iterable
+from array import array
+from collections.abc import Iterable, Mapping
 from contextlib import contextmanager
 from pathlib import Path
 from PyHSPlasma import *
+from types import MappingProxyType
 
 from .. import enum_props
 from .node_core import *
@@ -139,6 +141,31 @@ class PlasmaAttributeArguments(bpy.types.PropertyGroup):
                 print("Unknown argument '{}' with value '{}'!".format(name, args[name]))
 
 
+# Maps attribute IDs to collection indices, keyed by the node's attribute ID layout. Every
+# node using a given script shares the same layout, so this is effectively per script.
+_attribute_indices = {}
+_MAX_CACHED_LAYOUTS = 256
+
+
+class _PlasmaAttributeMap(Mapping):
+    """Read-only mapping of attribute IDs to a Python File node's attributes. Only indices are
+       cached; the attributes themselves are fetched on lookup because references to collection
+       items do not survive changes to the collection."""
+
+    def __init__(self, attributes, indices):
+        self._attributes = attributes
+        self._indices = indices
+
+    def __getitem__(self, key):
+        return self._attributes[self._indices[key]]
+
+    def __iter__(self):
+        return iter(self._indices)
+
+    def __len__(self):
+        return len(self._indices)
+
+
 class PlasmaAttribute(bpy.types.PropertyGroup):
     # This is thy lookup helper
     type_LUT = {
@@ -225,7 +252,17 @@ class PlasmaPythonFileNode(PlasmaVersionedNode, bpy.types.Node):
 
     @property
     def attribute_map(self):
-        return { i.attribute_id: i for i in self.attributes }
+        attributes = self.attributes
+        ids = array("i", [0]) * len(attributes)
+        attributes.foreach_get("attribute_id", ids)
+        key = ids.tobytes()
+        indices = _attribute_indices.get(key)
+        if indices is None:
+            if len(_attribute_indices) >= _MAX_CACHED_LAYOUTS:
+                _attribute_indices.clear()
+            indices = MappingProxyType({ attribute_id: i for i, attribute_id in enumerate(ids) })
+            _attribute_indices[key] = indices
+        return _PlasmaAttributeMap(attributes, indices)
 
     def draw_buttons(self, context, layout):
         main_row = layout.row(align=True)
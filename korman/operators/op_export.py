@@ -63,6 +63,20 @@ class PlasmaAgeExportOperator(ExportOperator, bpy.types.Operator):
                                         "description": "Forces the Blender System Console open during the export",
                                         "default": True}),
 
+        "log_level": (EnumProperty, {"name": "Export Log",
+                                     "description": "Specifies which messages are written to the export log",
+                                     "items": [("all", "Log Everything", "All export messages are logged"),
+                                               ("problems", "Log Problems Only", "Only warnings, errors, and porting notes are logged (faster export)")],
+                                     "default": "all"}),
+
+        "event_log": (BoolProperty, {"name": "Write Event Log",
+                                     "description": "Writes a machine-readable (JSON Lines) log of export events next to the export log",
+                                     "default": False}),
+
+        "live_progress": (BoolProperty, {"name": "Live Progress",
+                                         "description": "Continuously updates the export progress and estimated time remaining in the console",
+                                         "default": True}),
+
         "texcache_path": (StringProperty, {"name": "Texture Cache Path",
                                            "description": "Texture Cache Filepath"}),
 
@@ -167,6 +181,9 @@ class PlasmaAgeExportOperator(ExportOperator, bpy.types.Operator):
         row.enabled = korlib.ConsoleToggler.is_platform_supported()
         row.prop(age, "show_console")
         layout.prop(age, "verbose")
+        layout.prop(age, "log_level")
+        layout.prop(age, "event_log")
+        layout.prop(age, "live_progress")
 
     def __getattr__(self, attr):
         if attr in self._properties:
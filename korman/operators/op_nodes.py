@@ -224,13 +224,13 @@ class PlPyAttributeNodeOperator(NodeOperator, bpy.types.Operator):
         attribs = get_attributes_from_str(text_id.as_string())
 
         node = eval(self.node_path)
-        node_attrib_map = node.attribute_map
         node_attribs = node.attributes
 
         # Remove any that p00fed
-        for cached in node.attributes:
-            if cached.attribute_id not in attribs:
-                node_attribs.remove(cached)
+        for i in reversed(range(len(node_attribs))):
+            if node_attribs[i].attribute_id not in attribs:
+                node_attribs.remove(i)
+        node_attrib_map = node.attribute_map
 
         # Update or create
         for idx, attrib in attribs.items():
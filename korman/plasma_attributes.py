@@ -1,5 +1,7 @@
 import re
 import ast
+import hashlib
+from types import MappingProxyType
 
 # We want to grab all of the ptAttributes initialized at the start of every
 # script.  We could use the Abstract Syntax Tree parser... except that if we
@@ -24,6 +26,12 @@ import ast
 ptAttribFunction = "(#*\w+?\s*?=\s*?ptAttrib[^()]+?\s*?\(.+\).*\s*?)"
 funcregex = re.compile(ptAttribFunction)
 
+# Parsed attributes, keyed by a digest of the script text. Node refreshes and the
+# socket-link search ask for the same scripts over and over, so we only pay for the
+# regex scan and the AST parse once per revision of each script.
+_attribute_cache = {}
+_MAX_CACHED_SCRIPTS = 256
+
 
 class PlasmaAttributeVisitor(ast.NodeVisitor):
     def __init__(self):
@@ -106,9 +114,22 @@ def get_attributes_from_file(filepath):
     """Scan the file for assignments matching our regex, let our visitor parse them, and return the
        file's ptAttribs, if any."""
     with open(str(filepath)) as script:
-        return get_attributes_from_str(script.read())
+        return _parse_attributes(script.read())
 
 def get_attributes_from_str(code):
+    """Returns the ptAttribs in a script's source code. The result is cached by the content of
+       the script and is therefore read-only."""
+    key = hashlib.sha1(code.encode("utf-8", "surrogatepass")).digest()
+    attribs = _attribute_cache.get(key)
+    if attribs is None:
+        if len(_attribute_cache) >= _MAX_CACHED_SCRIPTS:
+            _attribute_cache.clear()
+        attribs = MappingProxyType({ idx: MappingProxyType(attrib)
+                                     for idx, attrib in _parse_attributes(code).items() })
+        _attribute_cache[key] = attribs
+    return attribs
+
+def _parse_attributes(code):
     results = funcregex.findall(code)
     if results:
         # We'll fake the ptAttribs being all alone in a module...
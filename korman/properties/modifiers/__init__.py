@@ -28,6 +28,11 @@ from .sound import *
 from .water import *
 
 class PlasmaModifiers(bpy.types.PropertyGroup):
+    # The IDs of every modifier and of those carrying translations. These are indexed at
+    # registration time so that we don't have to dir() every object we look at.
+    _modifier_ids = ()
+    _translatable_ids = ()
+
     def determine_next_id(self):
         """Gets the ID for the next modifier in the UI"""
         # This is NOT a property, otherwise the modifiers property would access this...
@@ -43,12 +48,18 @@ class PlasmaModifiers(bpy.types.PropertyGroup):
         """Generates all of the enabled modifiers.
            NOTE: We do not promise to return modifiers in their display_order!
         """
-        for i in dir(self):
-            attr = getattr(self, i, None)
-            # Assumes each modifier is a single pointer to PlasmaModifierProperties
-            if isinstance(attr, PlasmaModifierProperties):
-                if attr.enabled:
-                    yield attr
+        for i in self._modifier_ids:
+            attr = getattr(self, i)
+            if attr.enabled:
+                yield attr
+
+    @property
+    def translatable_modifiers(self):
+        """Generates all of the enabled modifiers that carry localization data."""
+        for i in self._translatable_ids:
+            attr = getattr(self, i)
+            if attr.enabled:
+                yield attr
 
     @classmethod
     def register(cls):
@@ -65,6 +76,9 @@ class PlasmaModifiers(bpy.types.PropertyGroup):
             for name, (prop, kwargs) in PlasmaModifierProperties._subprops.items():
                 setattr(i, name, prop(**kwargs))
             setattr(cls, i.pl_id, bpy.props.PointerProperty(type=i))
+        cls._modifier_ids = tuple(i.pl_id for i in PlasmaModifierProperties.__subclasses__())
+        cls._translatable_ids = tuple(i.pl_id for i in PlasmaModifierProperties.__subclasses__()
+                                      if hasattr(i, "export_localization"))
         bpy.types.Object.plasma_modifiers = bpy.props.PointerProperty(type=cls)
 
     def test_property(self, property : str) -> bool:
@@ -15,6 +15,7 @@
 
 import bpy
 from bpy.props import *
+import math
 from PyHSPlasma import *
 
 from .base import PlasmaModifierProperties
@@ -104,6 +105,50 @@ class PlasmaCollider(PlasmaModifierProperties):
                                    type=bpy.types.Object,
                                    poll=idprops.poll_mesh_objects)
 
+    simplify = BoolProperty(name="Simplify",
+                            description="Reduces the number of triangles in the triangle mesh collision",
+                            default=False,
+                            options=set())
+    simplify_target = IntProperty(name="Target Triangles",
+                                  description="Decimates the collision mesh down to this many triangles (zero disables decimation)",
+                                  min=0,
+                                  default=1000,
+                                  options=set())
+    simplify_angle = FloatProperty(name="Planar Angle",
+                                   description="Merges adjacent faces that meet at less than this angle (zero disables merging)",
+                                   subtype="ANGLE",
+                                   min=0.0,
+                                   max=math.radians(45.0),
+                                   default=math.radians(1.0),
+                                   options=set())
+    simplify_weld = FloatProperty(name="Weld Distance",
+                                  description="Merges vertices that are closer than this distance",
+                                  subtype="DISTANCE",
+                                  min=0.0,
+                                  soft_max=0.1,
+                                  default=0.001,
+                                  precision=4,
+                                  options=set())
+
+    decompose = BoolProperty(name="Convex Decomposition",
+                             description="Splits concave objects into several convex hulls",
+                             default=False,
+                             options=set())
+    decompose_max_hulls = IntProperty(name="Max Hulls",
+                                      description="Largest number of convex hulls to split the object into",
+                                      min=2,
+                                      soft_max=32,
+                                      max=256,
+                                      default=8,
+                                      options=set())
+    decompose_concavity = FloatProperty(name="Concavity",
+                                        description="Fraction of a convex hull that may be empty space before it is split again",
+                                        subtype="FACTOR",
+                                        min=0.0,
+                                        max=1.0,
+                                        default=0.05,
+                                        options=set())
+
     surface = EnumProperty(name="Surface Type",
                            description="Type of surface sound effect to play on collision",
                            items=surface_types,
@@ -26,6 +26,10 @@ from .base import PlasmaModifierProperties, PlasmaModifierUpgradable, PlasmaModi
 from ... import enum_props
 from ..prop_camera import PlasmaCameraProperties
 
+# Faces whose planes are within these tolerances are treated as a single plane
+_PLANE_NORMAL_TOLERANCE = 0.9999
+_PLANE_DIST_TOLERANCE = 0.001
+
 footstep_surface_ids = {
     "dirt": 0,
     # 1 = NULL
@@ -295,15 +299,24 @@ class PlasmaSoftVolume(idprops.IDPropMixin, PlasmaModifierProperties):
             bmesh.ops.recalc_face_normals(mesh, faces=mesh.faces)
             bmesh.ops.reverse_faces(mesh, faces=mesh.faces, flip_multires=True)
 
-            isect = plConvexIsect()
+            # Coplanar faces (eg a triangulated box) all describe the same plane, and the client
+            # tests every plane each frame, so only export each unique plane once.
+            planes = []
             for ngon in mesh.faces:
                 normal = xform * ngon.normal * -1
                 normal.normalize()
-                normal = hsVector3(*normal)
-                for vertex in ngon.verts:
-                    pos = matrix * vertex.co
-                    isect.addPlane(normal, hsVector3(*pos))
+                pos = matrix * ngon.calc_center_median()
+                dist = normal.dot(pos)
+                if not any(normal.dot(i[0]) >= _PLANE_NORMAL_TOLERANCE and abs(dist - i[1]) <= _PLANE_DIST_TOLERANCE
+                           for i in planes):
+                    planes.append((normal, dist, pos))
+
+            isect = plConvexIsect()
+            for normal, dist, pos in planes:
+                isect.addPlane(hsVector3(*normal), hsVector3(*pos))
             sv.volume = isect
+            exporter.report.msg("SoftVolume '{}': {} faces exported as {} planes",
+                                bo.name, len(mesh.faces), len(planes))
 
     def _export_sv_nodes(self, exporter, bo, so):
         tree = self.get_node_tree()
@@ -423,6 +423,7 @@ class PlasmaLightMapGen(idprops.IDPropMixin, PlasmaModifierProperties, PlasmaMod
                                   ("512", "512px", "512x512 pixels"),
                                   ("1024", "1024px", "1024x1024 pixels"),
                                   ("2048", "2048px", "2048x2048 pixels"),
+                                  ("AUTO", "Automatic", "Sized from the object's surface area and the Age's lightmap density"),
                             ])
 
     bake_type = EnumProperty(name="Bake To",
@@ -455,6 +456,10 @@ class PlasmaLightMapGen(idprops.IDPropMixin, PlasmaModifierProperties, PlasmaMod
                             description="Use this image instead of re-baking the lighting each export",
                             type=bpy.types.Image)
 
+    # Implementation details
+    uv_cache_key = StringProperty(description="INTERNAL: Hash of the geometry used to generate the lightmap UVs",
+                                  options={"HIDDEN"})
+
     @property
     def bake_lightmap(self):
         if not self.enabled:
@@ -487,6 +492,14 @@ class PlasmaLightMapGen(idprops.IDPropMixin, PlasmaModifierProperties, PlasmaMod
         mat_mgr = exporter.mesh.material
         materials = mat_mgr.get_materials(bo)
 
+        # Constant and duplicate generated lightmaps are shared, and the cheapest acceptable encoding
+        # is picked. Lightmaps supplied by the artist are exported as they are.
+        if self.image is None:
+            max_error = bpy.context.scene.world.plasma_age.lightmap_max_error
+            lightmap_im, allowed_formats = exporter.oven.get_lightmap_export(lightmap_im, max_error)
+        else:
+            allowed_formats = {"PNG", "JPG"}
+
         # Find the stupid UVTex
         uvtex_name = exporter.oven.lightmap_uvtex_name
         uvw_src = next((i for i, uvtex in enumerate(bo.data.uv_textures) if uvtex.name == uvtex_name), None)
@@ -515,7 +528,7 @@ class PlasmaLightMapGen(idprops.IDPropMixin, PlasmaModifierProperties, PlasmaMod
 
             # Mmm... cheating
             mat_mgr.export_prepared_image(owner=layer, image=lightmap_im,
-                                          allowed_formats={"PNG", "JPG"},
+                                          allowed_formats=allowed_formats,
                                           extension="hsm",
                                           ephemeral=True)
 
@@ -534,9 +547,14 @@ class PlasmaLightMapGen(idprops.IDPropMixin, PlasmaModifierProperties, PlasmaMod
     def latest_version(self):
         return 2
 
+    @property
+    def auto_resolution(self):
+        return self.quality == "AUTO"
+
     @property
     def resolution(self):
-        return int(self.quality)
+        """Returns the artist selected lightmap size or None if it is to be calculated"""
+        return None if self.auto_resolution else int(self.quality)
 
     def upgrade(self):
         # In version 1, bake passes were assigned on a per modifier basis by setting
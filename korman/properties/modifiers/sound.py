@@ -18,11 +18,16 @@ from __future__ import annotations
 import bpy
 from bpy.props import *
 from bpy.app.handlers import persistent
+from collections import OrderedDict
 from contextlib import contextmanager
+from hashlib import md5
+import json
 import math
 import os.path
+from pathlib import Path
 from PyHSPlasma import *
 from typing import *
+from zlib import adler32
 
 from ... import korlib
 from .base import PlasmaModifierProperties
@@ -38,6 +43,55 @@ _randomsound_modes = {
     "sequential": plRandomSoundMod.kSequential
 }
 
+# Sound header info, keyed by the sound file's identity (path, size, and modify time) or the
+# hash of its packed data. This is persisted so that we don't have to dig through the same
+# (potentially huge) audio files on every export. Entries are kept in least recently used order.
+_sound_info_cache = None
+_sound_info_dirty = False
+_MAX_SOUND_INFO_ENTRIES = 4096
+
+# Hashing packed sound data is expensive, so the digest is only computed once per datablock.
+# A cheap checksum of the data is kept alongside it to notice when the sound is repacked.
+_packed_sound_digests = {}
+
+def _get_sound_info_cache_path():
+    return Path(bpy.utils.user_resource("DATAFILES", "korman", True), "soundinfo.json")
+
+def _load_sound_info_cache():
+    global _sound_info_cache
+    if _sound_info_cache is None:
+        try:
+            with _get_sound_info_cache_path().open("r") as handle:
+                _sound_info_cache = json.load(handle, object_pairs_hook=OrderedDict)
+        except (OSError, ValueError):
+            pass
+        # Don't choke on a damaged or unexpected cache file, just start over.
+        if not isinstance(_sound_info_cache, OrderedDict):
+            _sound_info_cache = OrderedDict()
+    return _sound_info_cache
+
+def save_sound_info_cache():
+    """Writes any changes to the sound info cache to disk"""
+    global _sound_info_dirty
+    if not _sound_info_dirty:
+        return
+    _sound_info_dirty = False
+    try:
+        cache_path = _get_sound_info_cache_path()
+        temp_path = cache_path.with_suffix(".tmp")
+        with temp_path.open("w") as handle:
+            json.dump(_sound_info_cache, handle)
+        os.replace(str(temp_path), str(cache_path))
+    except OSError:
+        pass
+
+@persistent
+def _save_sound_info_cache(dummy):
+    # Sounds picked in the UI are cached outside of any export, so catch those up here.
+    save_sound_info_cache()
+
+bpy.app.handlers.save_post.append(_save_sound_info_cache)
+
 class PlasmaRandomSound(PlasmaModifierProperties):
     pl_id = "random_sound"
     pl_depends = {"soundemit"}
@@ -430,23 +484,63 @@ class PlasmaSound(idprops.IDPropMixin, bpy.types.PropertyGroup):
 
     def _get_sound_info(self):
         """Generates a tuple (plWAVHeader, PCMsize) from the current sound"""
+        global _sound_info_dirty
         try:
-            with self._open_sound_stream() as stream:
-                magic = stream.read(4)
-                stream.rewind()
-
-                header = plWAVHeader()
-                if magic == b"RIFF":
-                    size = korlib.inspect_wavefile(stream, header)
-                    return (header, size)
-                elif magic == b"OggS":
-                    size = korlib.inspect_vorbisfile(stream, header)
-                    return (header, size)
-                else:
-                    raise NotImplementedError("unsupported audio format")
+            key = self._get_sound_info_key()
+            cache = _load_sound_info_cache()
+            info = cache.get(key)
+            if info is None:
+                header, size = self._read_sound_info()
+                stream = hsRAMStream()
+                header.write(stream)
+                cache[key] = { "header": stream.buffer.hex(), "size": size }
+                while len(cache) > _MAX_SOUND_INFO_ENTRIES:
+                    cache.popitem(last=False)
+                _sound_info_dirty = True
+                return (header, size)
+            # Hits only reorder the entries, which is not worth a write on its own.
+            cache.move_to_end(key)
+
+            # NOTE: the header is modified by the export, so each caller gets their own.
+            header = plWAVHeader()
+            stream = hsRAMStream()
+            stream.buffer = bytes.fromhex(info["header"])
+            header.read(stream)
+            return (header, info["size"])
         except Exception as e:
             self._raise_error(str(e))
 
+    def _get_sound_info_key(self):
+        sound = self._sound
+        if sound.packed_file is None:
+            filepath = os.path.abspath(self._find_sound_file())
+            stat = os.stat(filepath)
+            return "file:{}:{}:{}".format(os.path.normcase(filepath), stat.st_size, stat.st_mtime_ns)
+        else:
+            data = sound.packed_file.data
+            checksum = adler32(data)
+            digest_key = sound.as_pointer()
+            memo = _packed_sound_digests.get(digest_key)
+            if memo is None or memo[0] != (len(data), checksum):
+                memo = ((len(data), checksum), md5(data).hexdigest())
+                _packed_sound_digests[digest_key] = memo
+            return "packed:{}".format(memo[1])
+
+    def _read_sound_info(self):
+        with self._open_sound_stream() as stream:
+            magic = stream.read(4)
+            stream.rewind()
+
+            header = plWAVHeader()
+            if magic == b"RIFF":
+                size = korlib.inspect_wavefile(stream, header)
+                return (header, size)
+            elif magic == b"OggS":
+                size = korlib.inspect_vorbisfile(stream, header)
+                return (header, size)
+            else:
+                raise NotImplementedError("unsupported audio format")
+
     def _find_sound_buffer(self, exporter, so, wavHeader, dataSize, channel):
         # First, cleanup the file path to not have directories
         filename = bpy.path.basename(self._sound.filepath)
@@ -483,16 +577,20 @@ class PlasmaSound(idprops.IDPropMixin, bpy.types.PropertyGroup):
     def is_3d_stereo(self):
         return self.sfx_type == "kSoundFX" and self.channel == {"L", "R"} and self.is_stereo
 
+    def _find_sound_file(self):
+        sound = self._sound
+        filepath = sound.filepath
+        if not os.path.exists(filepath):
+            filepath = bpy.path.abspath(filepath)
+        if not os.path.exists(filepath):
+            self._raise_error(f"Sound file not found! Requested '{sound.filepath}' - resolved to '{filepath}'")
+        return filepath
+
     @contextmanager
     def _open_sound_stream(self):
         sound = self._sound
         if sound.packed_file is None:
-            filepath = sound.filepath
-            if not os.path.exists(filepath):
-                filepath = bpy.path.abspath(filepath)
-            if not os.path.exists(filepath):
-                self._raise_error(f"Sound file not found! Requested '{sound.filepath}' - resolved to '{filepath}'")
-            with hsFileStream().open(filepath, fmRead) as fs:
+            with hsFileStream().open(self._find_sound_file(), fmRead) as fs:
                 yield fs
         else:
             stream = hsRAMStream()
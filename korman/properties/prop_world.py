@@ -14,6 +14,7 @@
 #    along with Korman.  If not, see <http://www.gnu.org/licenses/>.
 
 import bpy
+import math
 from bpy.props import *
 from PyHSPlasma import *
 
@@ -145,6 +146,17 @@ class PlasmaPage(bpy.types.PropertyGroup):
                              ],
                              default="room",
                              options=set())
+    lightmap_max_size = EnumProperty(name="Max Lightmap Size",
+                                     description="Largest size an automatically sized lightmap on this page may have",
+                                     items=[
+                                        ("128", "128px", "128x128 pixels"),
+                                        ("256", "256px", "256x256 pixels"),
+                                        ("512", "512px", "512x512 pixels"),
+                                        ("1024", "1024px", "1024x1024 pixels"),
+                                        ("2048", "2048px", "2048x2048 pixels"),
+                                     ],
+                                     default="1024",
+                                     options=set())
 
     # Implementation details...
     last_name = StringProperty(description="INTERNAL: Cached page name",
@@ -208,6 +220,57 @@ class PlasmaAge(bpy.types.PropertyGroup):
     age_name = StringProperty(name="Age Name",
                               description="Name of the Age to be used for data files",
                               options=set())
+    lightmap_density = FloatProperty(name="Lightmap Density",
+                                     description="Target number of lightmap pixels per unit of surface for automatically sized lightmaps",
+                                     default=16.0,
+                                     min=0.01,
+                                     soft_max=256.0,
+                                     options=set())
+    lightmap_max_error = FloatProperty(name="Lightmap Compression Error",
+                                       description="Largest estimated error (in 8-bit color levels) allowed when DXT1 compressing lightmaps. Zero disables DXT1 compression of lightmaps",
+                                       default=4.0,
+                                       min=0.0,
+                                       soft_max=16.0,
+                                       options=set())
+    anim_reduce_keys = BoolProperty(name="Reduce Keyframes",
+                                    description="Removes animation keyframes that can be recreated by interpolating their neighbors",
+                                    default=False,
+                                    options=set())
+    anim_tolerance_position = FloatProperty(name="Position",
+                                            description="Largest distance an object may stray from its animated position",
+                                            subtype="DISTANCE",
+                                            default=0.001,
+                                            min=0.0,
+                                            soft_max=0.1,
+                                            precision=4,
+                                            options=set())
+    anim_tolerance_rotation = FloatProperty(name="Rotation",
+                                            description="Largest angle an object may stray from its animated rotation",
+                                            subtype="ANGLE",
+                                            default=math.radians(0.1),
+                                            min=0.0,
+                                            soft_max=math.radians(5.0),
+                                            options=set())
+    anim_tolerance_scale = FloatProperty(name="Scale",
+                                         description="Largest difference allowed from the animated scale",
+                                         default=0.001,
+                                         min=0.0,
+                                         soft_max=0.1,
+                                         precision=4,
+                                         options=set())
+    anim_tolerance_color = FloatProperty(name="Color",
+                                         description="Largest difference allowed from an animated lamp color",
+                                         default=1.0 / 255.0,
+                                         min=0.0,
+                                         soft_max=0.1,
+                                         precision=4,
+                                         options=set())
+    anim_tolerance_volume = FloatProperty(name="Volume",
+                                          description="Largest difference (in decibels) allowed from an animated sound volume",
+                                          default=0.1,
+                                          min=0.0,
+                                          soft_max=3.0,
+                                          options=set())
 
     # Implementation details
     active_page_index = IntProperty(name="Active Page Index")
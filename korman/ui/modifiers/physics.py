@@ -42,9 +42,24 @@ def collision(modifier, layout, context):
     col.prop(modifier, "mass")
 
     layout.separator()
-    row = layout.row()
-    row.active = modifier.bounds == "trimesh"
-    row.prop(modifier, "proxy_object")
+    col = layout.column()
+    col.active = modifier.bounds == "hull" and not modifier.dynamic
+    col.prop(modifier, "decompose")
+    sub = col.column(align=True)
+    sub.active = modifier.bounds == "hull" and not modifier.dynamic and modifier.decompose
+    sub.prop(modifier, "decompose_max_hulls")
+    sub.prop(modifier, "decompose_concavity")
+
+    layout.separator()
+    col = layout.column()
+    col.active = modifier.bounds == "trimesh"
+    col.prop(modifier, "proxy_object")
+    col.prop(modifier, "simplify")
+    sub = col.column(align=True)
+    sub.active = modifier.bounds == "trimesh" and modifier.simplify
+    sub.prop(modifier, "simplify_target")
+    sub.prop(modifier, "simplify_angle")
+    sub.prop(modifier, "simplify_weld")
 
 def subworld_def(modifier, layout, context):
     layout.prop(modifier, "sub_type")
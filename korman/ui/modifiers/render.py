@@ -236,6 +236,8 @@ def lightmap(modifier, layout, context):
     col = layout.column()
     col.active = is_texture
     col.prop(modifier, "quality")
+    if modifier.auto_resolution:
+        col.label("Size will be picked by the Age's lightmap density.", icon="INFO")
     layout.prop_search(modifier, "bake_pass_name", pl_scene, "bake_passes", icon="RENDERLAYERS")
     layout.prop(modifier, "lights")
     col = layout.column()
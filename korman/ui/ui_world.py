@@ -223,6 +223,8 @@ class PlasmaAgePanel(AgeButtonsPanel, bpy.types.Panel):
             col = split.column()
             col.label("Export For:")
             col.prop(active_page, "version")
+            col.label("Max Lightmap Size:")
+            col.prop(active_page, "lightmap_max_size", text="")
 
             col = split.column()
             default_page = active_page.seq_suffix == 0
@@ -292,10 +294,22 @@ class PlasmaAgePanel(AgeButtonsPanel, bpy.types.Panel):
         layout.separator()
         layout.prop(age, "envmap_method")
         layout.prop(age, "lighting_method")
+        layout.prop(age, "lightmap_density")
+        layout.prop(age, "lightmap_max_error")
         layout.prop(age, "localization_method")
         layout.prop(age, "python_method")
         layout.prop(age, "texcache_method")
 
+        box = layout.box()
+        box.prop(age, "anim_reduce_keys")
+        col = box.column(align=True)
+        col.active = age.anim_reduce_keys
+        col.prop(age, "anim_tolerance_position")
+        col.prop(age, "anim_tolerance_rotation")
+        col.prop(age, "anim_tolerance_scale")
+        col.prop(age, "anim_tolerance_color")
+        col.prop(age, "anim_tolerance_volume")
+
 
 class PlasmaEnvironmentPanel(AgeButtonsPanel, bpy.types.Panel):
     bl_label = "Plasma Environment"